@@ -0,0 +1,114 @@
+"""
+Versioned store of pre-generated answers for the curated question banks.
+
+Answers are produced offline by pregenerate_answers.py and served by /ask for
+exact or normalized matches. Each answer records the domain version (prompt
+template + chat model + FAISS index) it was generated with, so a changed prompt
+or index makes old answers stale instead of silently serving them.
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+import unicodedata
+
+ANSWER_STORE_DIR = os.environ.get("ANSWER_STORE_DIR", "answer_store")
+STORE_FORMAT_VERSION = 1
+
+# Whitespace, quotes and sentence-final punctuation are ignored when matching
+# questions; everything else is kept, "7.5%" and "75%" are different questions
+_IGNORED_CHARS = re.compile(r"[\s\"'“”「」『』]+")
+_FINAL_PUNCTUATION = re.compile(r"[?？!！。.~～…]+$")
+
+
+def normalize_question(text):
+    """Normalize a question for matching (NFKC, casefold, no spaces/quotes/final punctuation)"""
+    text = unicodedata.normalize("NFKC", text or "").casefold()
+    return _FINAL_PUNCTUATION.sub("", _IGNORED_CHARS.sub("", text))
+
+
+def domain_version(prompt_template, faiss_path, model_name):
+    """Short fingerprint of everything that changes the generated answer"""
+    from index_store import resolve_index_dir
+    faiss_path = resolve_index_dir(faiss_path)
+    digest = hashlib.sha256()
+    digest.update(prompt_template.encode("utf-8"))
+    digest.update(str(model_name).encode("utf-8"))
+    for name in ("index.faiss", "index.pkl", "manifest.json"):
+        path = os.path.join(faiss_path, name)
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                for block in iter(lambda: f.read(1 << 20), b""):
+                    digest.update(block)
+    return digest.hexdigest()[:12]
+
+
+class AnswerStore:
+    """One compact JSON file per model_type: <store_dir>/<model_type>.json"""
+
+    def __init__(self, store_dir=ANSWER_STORE_DIR):
+        self.store_dir = store_dir
+        self._domains = {}
+        self._lock = threading.Lock()
+
+    def path(self, model_type):
+        return os.path.join(self.store_dir, f"{model_type}.json")
+
+    def load(self, model_type):
+        """Return the raw entry list of a domain (empty when missing)"""
+        path = self.path(model_type)
+        if not os.path.exists(path):
+            return []
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"⚠️  Could not read answer store {path}: {e}")
+            return []
+        if data.get("format") != STORE_FORMAT_VERSION:
+            print(f"⚠️  Ignoring {path}: unsupported format {data.get('format')}")
+            return []
+        return data.get("entries", [])
+
+    def save(self, model_type, entries):
+        os.makedirs(self.store_dir, exist_ok=True)
+        path = self.path(model_type)
+        data = {"format": STORE_FORMAT_VERSION, "model_type": model_type, "entries": entries}
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(path + ".tmp", path)
+        with self._lock:
+            self._domains.pop(model_type, None)
+
+    def _index(self, model_type):
+        # Reloaded when the file changes, e.g. pregenerate_answers.py ran while serving
+        try:
+            mtime = os.stat(self.path(model_type)).st_mtime_ns
+        except OSError:
+            mtime = None
+        with self._lock:
+            cached = self._domains.get(model_type)
+            if cached is not None and cached[0] == mtime:
+                return cached[1]
+            exact, normalized = {}, {}
+            for entry in self.load(model_type):
+                exact[entry["q"]] = entry
+                normalized.setdefault(normalize_question(entry["q"]), entry)
+            index = (exact, normalized)
+            self._domains[model_type] = (mtime, index)
+            if exact:
+                print(f"✅ Answer store [{model_type}] loaded {len(exact)} answers")
+            return index
+
+    def get(self, model_type, question, version=None):
+        """Return the stored answer for question, or None.
+
+        When version is given, answers generated with another version are ignored.
+        """
+        exact, normalized = self._index(model_type)
+        entry = exact.get((question or "").strip()) or normalized.get(normalize_question(question))
+        if entry is None or (version is not None and entry["v"] != version):
+            return None
+        return entry["a"]
@@ -1,80 +1,209 @@
 print("Import library")
-from flask import Flask, request, render_template, jsonify
-from werkzeug.utils import secure_filename
+from flask import Flask, request, render_template, jsonify, Response, stream_with_context, send_from_directory, abort, url_for
+from flask_sock import Sock
 import os
-import whisper
-import torch
 # from TTS.api import TTS
 
 # Import shared models first to initialize them
 print("Loading shared models...")
 import shared_models
 
-# Import RAG inference modules (will use shared models)
-from rag_inference_gdm import qa_chain as qa_chain_gdm, compression_retriever as compression_retriever_gdm, related_question_chain as related_question_chain_gdm
-from rag_inference_ckd import qa_chain as qa_chain_ckd, compression_retriever as compression_retriever_ckd, related_question_chain as related_question_chain_ckd
-from rag_inference_ppd import qa_chain as qa_chain_ppd, compression_retriever as compression_retriever_ppd, related_question_chain as related_question_chain_ppd
+from shared_models import model_manager
+
+# RAG domains (indexes and chains are built on demand by the registry)
+from domains import DomainRegistry, prompt_text
 
 from opencc import OpenCC
 import uuid
-import edge_tts
 import base64
+import re
 import random
 import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from streaming import stream_answer, sse_event, SentenceAudioPipeline, strip_think
+from tts_service import select_voice, TTSCache
+from semantic_cache import SemanticCache, SEMANTIC_CACHE_ENABLED
+from answer_store import AnswerStore, domain_version
+from asr_service import decode_audio, SAMPLE_RATE
+from asr_streaming import StreamingTranscriber
+from asr_worker import ASRWorker, ASRQueueFull
+from model_server import RemoteASR
+from llm_scheduler import llm_scheduler, llm_priority, LLMOverloaded, RELATED
+from singleflight import SingleFlight, flight_key
+from related_questions import RelatedQuestions
+from domain_router import DomainRouter
+from context_assembly import prompt_stats
+import json
 
 print("Finish import")
 myuuid = uuid.uuid4()
 app = Flask(__name__)
+sock = Sock(app)
 UPLOAD_FOLDER = "temp"
 AUDIO_CLONE = "static"
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 #init model here
 print("init model")
-asr_model = whisper.load_model("medium")
+
+def load_asr_model():
+    # whisper / faster-whisper, model size, beam and VAD trim from config (see asr_engines.py)
+    from asr_engines import load_asr_engine
+    return load_asr_engine()
+
+# Heavy components are loaded concurrently in the background (or lazily, see model_manager.py)
+model_manager.register("opencc", lambda: OpenCC('s2twp'))
+domain_registry = DomainRegistry(model_manager)
+if shared_models.model_client is not None:
+    # ASR and its queue live in model_server.py, shared by all web workers
+    model_manager.register("model_server", shared_models.model_client.ping)
+    asr_model = RemoteASR(shared_models.model_client)
+else:
+    model_manager.register("asr", load_asr_model)
+    # All transcription goes through one queue in front of the model (see asr_worker.py)
+    asr_model = ASRWorker(model_manager.proxy("asr"))
 # device = "cuda" if torch.cuda.is_available() else "cpu"
 # tts = TTS(model_name="tts_models/zh-CN/baker/tacotron2-DDC-GST").to(device)
-cc = OpenCC('s2twp')
+cc = model_manager.proxy("opencc")
+# Sentence-level TTS runs here while the LLM keeps generating
+TTS_WORKERS = int(os.environ.get("TTS_WORKERS", "4"))
+tts_executor = ThreadPoolExecutor(max_workers=TTS_WORKERS, thread_name_prefix="tts")
+tts_cache = TTSCache()
+semantic_cache = SemanticCache(shared_models.shared_embeddings) if SEMANTIC_CACHE_ENABLED else None
+# Pre-generated question-bank answers (see pregenerate_answers.py)
+answer_store = AnswerStore()
+domain_versions = {
+    name: domain_version(prompt_text(config), config["faiss_path"], shared_models.shared_chat_model.model)
+    for name, config in domain_registry.domains.items()
+}
+# Identical questions in flight share one generation (see singleflight.py)
+single_flight = SingleFlight()
+# Follow-up suggestions for /related (see related_questions.py)
+related_questions = RelatedQuestions(shared_models.shared_embeddings)
+# model_type=auto picks the domain from the question bank embeddings (see domain_router.py)
+domain_router = DomainRouter(shared_models.shared_embeddings,
+                             lambda name: related_questions.bank(name, load_questions(name)))
+model_manager.start()
+domain_registry.start_reaper()
 print("Finish init model")
-def llm_inference_gdm(user_query):
-    """GDM (妊娠期糖尿病) inference"""
-    question = user_query
-    answer = qa_chain_gdm.invoke(question)
-    return answer
+def route_question(user_query, model_type="gdm"):
+    """(domain, domains): the domain answering the question and the domains it retrieves from.
 
-def llm_inference_ckd(user_query):
-    """CKD (慢性腎臟病) inference"""
-    question = user_query
-    answer = qa_chain_ckd.invoke(question)
-    return answer
+    model_type=auto (or any model_type with DOMAIN_ROUTING=always) is routed by the question;
+    an uncertain route retrieves from several domains with the prompt of the first.
+    """
+    names = domain_registry.names()
+    if not domain_router.should_route(model_type, names):
+        model_type = domain_registry.resolve(model_type)
+        return model_type, [model_type]
+    try:
+        domains, _ = domain_router.route(user_query, names)
+    except Exception as e:
+        print(f"⚠️  Domain routing failed, using {domain_registry.resolve(model_type)}: {e}")
+        domains = [domain_registry.resolve(model_type)]
+    return domains[0], domains
 
-def llm_inference_ppd(user_query):
-    """PPD (產後憂鬱症) inference"""
-    question = user_query
-    answer = qa_chain_ppd.invoke(question)
-    return answer
+def get_qa_chain(model_type="gdm", domains=None):
+    """根據model_type取得對應的qa_chain，未知的model_type使用 gdm；domains有多個時合併檢索"""
+    if domains and len(domains) > 1:
+        return domain_registry.fanout(domains)
+    return domain_registry.get(model_type)["qa_chain"]
 
-def llm_inference(user_query, model_type="gdm"):
+def llm_inference(user_query, model_type="gdm", domains=None):
     """通用inference函數，根據model_type選擇對應的模型"""
-    if model_type == "ckd":
-        return llm_inference_ckd(user_query)
-    elif model_type == "ppd":
-        return llm_inference_ppd(user_query)
-    else:  # 預設使用 gdm
-        return llm_inference_gdm(user_query)
+    return get_qa_chain(model_type, domains).invoke(user_query)
+
+def llm_stream(user_query, model_type="gdm", domains=None):
+    """Streaming版本的inference，逐段回傳模型輸出"""
+    return get_qa_chain(model_type, domains).stream(user_query)
+
+def postprocess_answer(answer):
+    """Remove <think>...</think> tags and convert to Traditional Chinese"""
+    return cc.convert(strip_think(answer))
+
+def stored_answer(user_query, model_type="gdm"):
+    """Pre-generated answer for a question-bank question, or None"""
+    model_type = domain_registry.resolve(model_type)
+    answer = answer_store.get(model_type, user_query, domain_versions[model_type])
+    if answer is not None:
+        print(f"✅ Answer store hit [{model_type}]")
+    return answer
+
+def answer_scope(model_type="gdm", domains=None):
+    """(name, version) an answer is cached and single-flighted under.
+
+    A fan-out answer retrieved from several indexes gets its own "gdm+ckd" scope,
+    so it is never served to a request for the first domain alone.
+    """
+    model_type = domain_registry.resolve(model_type)
+    if not domains or len(domains) < 2:
+        return model_type, domain_versions[model_type]
+    return "+".join(domains), "+".join(domain_versions[name] for name in domains)
+
+def cache_lookup(user_query, model_type="gdm", domains=None):
+    """Semantic cache lookup, returns (answer, embedding). Never raises."""
+    if semantic_cache is None:
+        return None, None
+    try:
+        name, version = answer_scope(model_type, domains)
+        return semantic_cache.lookup(name, user_query, version)
+    except Exception as e:
+        print(f"⚠️  Semantic cache lookup failed: {e}")
+        return None, None
+
+def cache_store(user_query, answer, model_type="gdm", embedding=None, domains=None):
+    if semantic_cache is None or not answer.strip():
+        return
+    try:
+        name, version = answer_scope(model_type, domains)
+        semantic_cache.store(name, user_query, answer, embedding, version)
+    except Exception as e:
+        print(f"⚠️  Semantic cache store failed: {e}")
+
+def answer_key(user_query, model_type="gdm", domains=None):
+    """Single-flight key: (domain(s), normalized question, prompt/model/index version)"""
+    name, version = answer_scope(model_type, domains)
+    return flight_key(name, user_query, version)
+
+def answer_question(user_query, model_type="gdm"):
+    """Post-processed answer, served from the answer store or semantic cache when possible"""
+    model_type, domains = route_question(user_query, model_type)
+    stored = stored_answer(user_query, model_type)
+    if stored is not None:
+        return stored
+
+    cached, embedding = cache_lookup(user_query, model_type, domains)
+    if cached is not None:
+        return cached
+
+    def generate():
+        # Reject before retrieval when the LLM queue cannot serve us in time
+        llm_scheduler.check()
+        start_time = time.time()
+        print(f"🔄 Running LLM inference with {model_type} model...")
+        answer = llm_inference(user_query, model_type, domains)
+        end_time = time.time() - start_time
+        print(f"✅ LLM: {end_time:.2f}s")
+
+        start_time = time.time()
+        answer = postprocess_answer(answer)
+        end_time = time.time() - start_time
+        print(f"✅ Convert: {end_time:.2f}s")
+
+        cache_store(user_query, answer, model_type, embedding, domains)
+        return answer
+
+    # Identical questions already being answered wait for that answer
+    return single_flight.run(answer_key(user_query, model_type, domains), generate)
 
 def load_questions(model_type: str = "gdm"):
     """Load questions file based on model_type/role.
 
-    Supported model_type values: 'gdm', 'ckd', 'ppd'. Defaults to 'gdm'.
+    model_type is any domain of the registry (gdm, ckd, ppd, ...). Defaults to 'gdm'.
     Falls back to a small set of default questions when file is missing.
     """
-    mapping = {
-        "gdm": "gdm_questions.txt",
-        "ckd": "ckd_questions.txt",
-        "ppd": "ppd_questions.txt",
-    }
-
-    filename = mapping.get(model_type, mapping["gdm"])  # default to gdm
+    filename = domain_registry.config(model_type)["question_file"]
     try:
         with open(filename, 'r', encoding='utf-8') as f:
             questions = [line.strip() for line in f if line.strip()]
@@ -87,6 +216,36 @@ def load_questions(model_type: str = "gdm"):
             "藥物的副作用是什麼？",
         ]
 
+def generate_related(user_query, model_type="gdm"):
+    """Raw follow-up questions from related_question_chain, behind chat answers in the LLM queue"""
+    with llm_priority(RELATED):
+        llm_scheduler.check()
+        message = domain_registry.get(model_type)["related_question_chain"].invoke({"user_input": user_query})
+    return cc.convert(strip_think(getattr(message, "content", message)))
+
+def warm_related_questions():
+    """Embed every question bank in the background, so /related never waits for it"""
+    for name in domain_registry.names():
+        try:
+            related_questions.bank(name, load_questions(name))
+        except Exception as e:
+            print(f"⚠️  Question bank embeddings for {name} failed: {e}")
+
+_warmup_pid = None
+
+def start_warmup():
+    """Background warm-ups, once per serving process. Called from the server startup
+    (after the gunicorn fork), so no Ollama connection is opened in the master."""
+    global _warmup_pid
+    if _warmup_pid == os.getpid():
+        return
+    _warmup_pid = os.getpid()
+    threading.Thread(target=warm_related_questions, name="related-warmup", daemon=True).start()
+    # qwen3 is loaded and the domain system prompts prefilled before the first question; the
+    # request holds an llm_scheduler slot, which must not be inherited by forked workers
+    threading.Thread(target=shared_models.warm_up_chat_model, name="llm-warmup", daemon=True,
+                     args=([config.get("system_prompt") for config in domain_registry.domains.values()],)).start()
+
 @app.route("/")
 def index():
     """Trang chọn chuyên khoa"""
@@ -144,20 +303,23 @@ def upload_audio():
         return "檔案名稱為空", 400
     
     try:
-        filename = secure_filename(file.filename)
-        filepath = os.path.join(UPLOAD_FOLDER, filename)
-        file.save(filepath)
-        print(f"✅ Audio saved: {filepath}")
+        # Decode in memory, no shared file in temp/ between concurrent uploads
+        start_time = time.time()
+        audio = decode_audio(file.read())
+        print(f"✅ Audio decoded: {len(audio) / SAMPLE_RATE:.2f}s of audio in {time.time() - start_time:.2f}s")
 
-        print("🎤 Transcribing with Whisper...")
-        result = asr_model.transcribe(filepath, language="zh")
+        print(f"🎤 Transcribing with {asr_model.name}...")
+        text, queue_wait, decode_time = asr_model.submit(audio, language="zh")
+        print(f"✅ ASR: queue {queue_wait:.2f}s, decode {decode_time:.2f}s")
         
-        # Bạn có thể gọi ASR để chuyển đổi giọng nói thành văn bản ở đây
-        # ví dụ: result = my_asr(filepath)
-        answer = cc.convert(result['text'])
+        answer = cc.convert(text)
         
         print(f"✅ Transcription: {answer}")
-        return answer
+        headers = {"X-ASR-Queue-Wait": f"{queue_wait:.3f}", "X-ASR-Decode-Time": f"{decode_time:.3f}"}
+        return answer, 200, headers
+    except ASRQueueFull as e:
+        print(f"⚠️  {str(e)}")
+        return "語音辨識忙碌中，請稍後再試", 503, {"Retry-After": "2"}
     except Exception as e:
         print(f"❌ Error in upload: {str(e)}")
         return f"錯誤: {str(e)}", 500
@@ -165,10 +327,109 @@ def upload_audio():
 
 
 
+@sock.route("/ws/asr")
+def ws_asr(ws):
+    """Streaming voice input: binary PCM16 16 kHz mono frames in, partial/final transcripts out.
+
+    The client sends {"type": "end"} as a text message when the user stops talking.
+    """
+    print("📥 WS /ws/asr - Streaming voice input")
+    transcriber = StreamingTranscriber(asr_model, cc)
+    try:
+        while True:
+            message = ws.receive()
+            if message is None:
+                break
+            if isinstance(message, (bytes, bytearray)):
+                for event in transcriber.feed_pcm16(message):
+                    ws.send(json.dumps(event, ensure_ascii=False))
+            elif json.loads(message).get("type") == "end":
+                start_time = time.time()
+                final = transcriber.finish()
+                print(f"✅ Final transcript in {time.time() - start_time:.2f}s: {final['text']}")
+                ws.send(json.dumps(final, ensure_ascii=False))
+                break
+    except Exception as e:
+        print(f"❌ Error in ws_asr: {str(e)}")
+        try:
+            ws.send(json.dumps({"type": "error", "text": f"錯誤: {str(e)}"}, ensure_ascii=False))
+        except Exception:
+            pass
+
+@app.get("/audio/<key>.mp3")
+def serve_audio(key):
+    """Cached TTS audio; immutable because the name is the content hash"""
+    if not re.fullmatch(r"[0-9a-f]{64}", key):
+        abort(404)
+    tts_cache.touch(key)
+    response = send_from_directory(tts_cache.directory, f"{key}.mp3", mimetype="audio/mpeg",
+                                   conditional=True, max_age=31536000)
+    response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+    return response
+
+@app.route("/related", methods=["GET", "POST"])
+def related():
+    """Follow-up questions: nearest question-bank entries, related_question_chain only on a miss"""
+    question = request.values.get("question")
+    model_type = request.values.get("model_type", "gdm")
+    count = request.values.get("count", type=int)
+    if not question:
+        return "請輸入問題", 400
+    model_type, _ = route_question(question, model_type)
+
+    start_time = time.time()
+    questions_bank = load_questions(model_type)
+    try:
+        questions, source = related_questions.related(
+            model_type, questions_bank, question, lambda q: generate_related(q, model_type), count)
+    except LLMOverloaded as e:
+        # Chat answers keep the LLM busy, the closest bank questions will do
+        print(f"⚠️  /related without LLM: {str(e)}")
+        questions, source = related_questions.nearest(model_type, questions_bank, question, count), "question_bank"
+    except Exception as e:
+        print(f"❌ Error in related: {str(e)}")
+        return jsonify({"questions": [], "error": str(e)}), 500
+    print(f"✅ Related [{model_type}] {source}: {len(questions)} questions in {time.time() - start_time:.2f}s")
+    return jsonify({"questions": questions, "source": source})
+
 @app.get("/ping")
 async def ping():
     return {"status": "healthy"}
 
+@app.get("/ready")
+def ready():
+    """Per-component load state; 503 until every eager component is loaded"""
+    status = model_manager.status()
+    return jsonify(status), 200 if status["ready"] else 503
+
+@app.get("/metrics")
+def metrics():
+    """Runtime counters for caches and queues"""
+    return jsonify({
+        "semantic_cache": semantic_cache.stats() if semantic_cache else None,
+        "embeddings": shared_models.embedding_stats(),
+        "reranker": shared_models.reranker_stats(),
+        "asr": asr_model.stats(),
+        "tts_cache": tts_cache.stats(),
+        "rerank_cache": shared_models.rerank_score_cache.stats() if shared_models.rerank_score_cache else None,
+        "llm": llm_scheduler.stats(),
+        "single_flight": single_flight.stats(),
+        "related": related_questions.stats(),
+        "router": domain_router.stats(),
+        "prompt": prompt_stats.stats(),
+    })
+
+@app.get("/llm/queue")
+def llm_queue():
+    """Queue position and estimated wait a new chat request would get right now"""
+    return jsonify(llm_scheduler.estimate())
+
+def overloaded_response(e):
+    """503 for requests rejected by the LLM scheduler"""
+    retry_after = max(1, int(e.retry_after))
+    body = {"answer": "系統忙碌中，請稍後再試", "retry_after": retry_after, "queue": llm_scheduler.estimate()}
+    return body, 503, {"Retry-After": str(retry_after)}
+
 @app.route("/ask", methods=["POST"])
 async def ask():
     print("📥 POST /ask - Processing question")
@@ -189,53 +450,126 @@ async def ask():
             print("❌ No question provided")
             return "請輸入問題", 400
 
-        start_time = time.time()
-        print(f"🔄 Running LLM inference with {model_type} model...")
-        answer = llm_inference(question, model_type)
-        end_time = time.time() - start_time
-        print(f"✅ LLM: {end_time:.2f}s")
-        
-        # Remove <think>...</think> tags server-side before any further processing
-        import re
-        answer = re.sub(r'<think>[\s\S]*?</think>', '', answer)
-        
-        start_time = time.time()
-        answer = cc.convert(answer)
-        end_time = time.time() - start_time
-        print(f"✅ Convert: {end_time:.2f}s")
+        answer = answer_question(question, model_type)
         
         start_time = time.time()
         if responseWithAudio == "true":
             print("🎵 Generating audio...")
-            # select voice by gender (male -> Yunyang, female -> Xiaoxiao)
-            if str(gender).lower() == 'male':
-                voices = "zh-CN-YunyangNeural"
-            else:
-                voices = "zh-CN-XiaoxiaoNeural"
-            myuuid = uuid.uuid4()
-            audio_name = str(myuuid) + '.mp3'
-            filepath = os.path.join(UPLOAD_FOLDER, audio_name)
-            tts = edge_tts.Communicate(
-                    text=answer,
-                    voice=voices)
-            await tts.save(filepath)
-            # return jsonify({"answer": answer, "audio": audio, "filepath": filepath})
-            with open(filepath, 'rb') as audio_file:
-                audio_data = audio_file.read()
-            audio_base64 = base64.b64encode(audio_data).decode('utf-8')
+            voices = select_voice(gender)
+            key = await asyncio.to_thread(tts_cache.get_or_synthesize, answer, voices)
             end_time = time.time() - start_time
             print(f"✅ Audio: {end_time:.2f}s")
-            return jsonify({"answer": answer, "audio_base64": audio_base64})
+            response = {"answer": answer, "audio_url": url_for("serve_audio", key=key)}
+            if request.form.get("audio_inline") == "true":
+                # Old clients that still expect the MP3 inlined as base64
+                with open(tts_cache.path(key), 'rb') as audio_file:
+                    response["audio_base64"] = base64.b64encode(audio_file.read()).decode('utf-8')
+            return jsonify(response)
         else:
             print("✅ Returning text answer")
             return jsonify({"answer": answer})
             
+    except LLMOverloaded as e:
+        print(f"⚠️  {str(e)}")
+        return overloaded_response(e)
     except Exception as e:
         print(f"❌ Error in ask: {str(e)}")
         import traceback
         traceback.print_exc()
         return jsonify({"answer": f"處理問題時發生錯誤: {str(e)}"}), 500
 
+@app.route("/ask/stream", methods=["POST"])
+def ask_stream():
+    """Server-Sent Events version of /ask: tokens are pushed as soon as they arrive,
+    and with responseWithAudio each finished sentence is synthesized and sent in order."""
+    print("📥 POST /ask/stream - Streaming answer")
+
+    question = request.form.get("question")
+    gender = request.form.get('gender', 'female')
+    model_type = request.form.get('model_type', 'gdm')
+    responseWithAudio = request.form.get("responseWithAudio", False)
+    print(f"   Question: {question}")
+    print(f"   Model: {model_type}")
+    print(f"   Audio: {responseWithAudio}")
+
+    if not question:
+        print("❌ No question provided")
+        return "請輸入問題", 400
+
+    with_audio = responseWithAudio == "true"
+    voice = select_voice(gender)
+    # url_for needs the request context, resolve the audio URL prefix up front
+    audio_prefix = url_for("serve_audio", key="KEY").replace("KEY.mp3", "")
+
+    def generate():
+        start_time = time.time()
+        first_token_time = None
+        parts = []
+        # Sentence audio is synthesized while the LLM keeps generating
+        audio = SentenceAudioPipeline(tts_executor, tts_cache.get_or_synthesize, voice)
+
+        def audio_events(wait=False):
+            for index, key in audio.ready(wait):
+                if index == 0:
+                    print(f"✅ First audio: {time.time() - start_time:.2f}s")
+                yield sse_event({"index": index, "audio_url": f"{audio_prefix}{key}.mp3"}, event="audio")
+
+        try:
+            domain, domains = route_question(question, model_type)
+            cached, embedding = stored_answer(question, domain), None
+            if cached is None:
+                cached, embedding = cache_lookup(question, domain, domains)
+            if cached is not None:
+                source = iter([cached])
+            else:
+                key = answer_key(question, domain, domains)
+                if not single_flight.in_flight(key):
+                    queue = llm_scheduler.estimate()
+                    llm_scheduler.check()
+                    if queue["position"]:
+                        yield sse_event(queue, event="queue")
+
+                def produce():
+                    segments = []
+                    for segment in stream_answer(llm_stream(question, domain, domains), cc):
+                        segments.append(segment)
+                        yield segment
+                    cache_store(question, "".join(segments), domain, embedding, domains)
+
+                # Attaches to the token stream of an identical question already in flight
+                source = single_flight.stream(key, produce)
+            for segment in source:
+                if first_token_time is None:
+                    first_token_time = time.time() - start_time
+                    print(f"✅ First token: {first_token_time:.2f}s")
+                parts.append(segment)
+                yield sse_event({"text": segment}, event="token")
+                if with_audio:
+                    audio.feed(segment)
+                    yield from audio_events()
+            print(f"✅ LLM stream: {time.time() - start_time:.2f}s")
+            if with_audio:
+                audio.flush()
+                yield from audio_events(wait=True)
+                print(f"✅ Audio: {time.time() - start_time:.2f}s ({audio.count} sentences)")
+            yield sse_event({"answer": "".join(parts)}, event="done")
+        except LLMOverloaded as e:
+            print(f"⚠️  {str(e)}")
+            body, _, _ = overloaded_response(e)
+            yield sse_event(body, event="error")
+        except Exception as e:
+            print(f"❌ Error in ask_stream: {str(e)}")
+            import traceback
+            traceback.print_exc()
+            yield sse_event({"answer": f"處理問題時發生錯誤: {str(e)}"}, event="error")
+        finally:
+            # Also runs on GeneratorExit when the client disconnects
+            audio.cancel()
+
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return Response(stream_with_context(generate()), mimetype="text/event-stream", headers=headers)
+
 if __name__ == "__main__":
+    start_warmup()
     app.run(host="0.0.0.0", port=80, debug=True)
 
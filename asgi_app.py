@@ -0,0 +1,258 @@
+"""
+ASGI entry point for production serving:
+
+  uvicorn asgi_app:application --host 0.0.0.0 --port 80
+
+/ask, /ask/stream and /ws/asr are native async routes: the LLM is called with
+qa_chain.ainvoke()/astream(), so a request waiting on Ollama only holds an
+await point instead of a thread. Blocking work (retrieval, rerank, semantic
+cache, TTS, ASR) runs on bounded executors. Every other route is served by
+the Flask app from app.py through a WSGI adapter, so both modes share the same
+models, caches and templates. The adapter runs Flask requests on a pool of
+ASGI_WSGI_WORKERS threads, so a slow /related does not hold up /upload,
+/audio or /ready.
+"""
+
+import asyncio
+import base64
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.routing import Mount, Route, WebSocketRoute
+from starlette.websockets import WebSocketDisconnect
+
+import app as flask_server
+from streaming import astream_answer, sse_event, SentenceAudioPipeline
+from tts_service import select_voice
+from asr_streaming import StreamingTranscriber
+from llm_scheduler import llm_scheduler, LLMOverloaded
+
+# Threads for blocking calls made from async routes (langchain runs FAISS,
+# rerank and embeddings on the loop's default executor)
+ASGI_BLOCKING_WORKERS = int(os.environ.get("ASGI_BLOCKING_WORKERS", "16"))
+# Threads serving the mounted Flask routes
+ASGI_WSGI_WORKERS = int(os.environ.get("ASGI_WSGI_WORKERS", "16"))
+AUDIO_PREFIX = "/audio/"
+
+blocking_executor = ThreadPoolExecutor(max_workers=ASGI_BLOCKING_WORKERS, thread_name_prefix="asgi")
+
+
+async def run_blocking(func, *args):
+    return await asyncio.get_running_loop().run_in_executor(blocking_executor, func, *args)
+
+
+async def _once(text):
+    yield text
+
+
+async def answer_question_async(user_query, model_type="gdm"):
+    """Async version of app.answer_question"""
+    model_type, domains = await run_blocking(flask_server.route_question, user_query, model_type)
+    stored = flask_server.stored_answer(user_query, model_type)
+    if stored is not None:
+        return stored
+
+    cached, embedding = await run_blocking(flask_server.cache_lookup, user_query, model_type, domains)
+    if cached is not None:
+        return cached
+
+    async def generate():
+        llm_scheduler.check()
+        start_time = time.time()
+        print(f"🔄 Running LLM inference with {model_type} model...")
+        qa_chain = await run_blocking(flask_server.get_qa_chain, model_type, domains)
+        answer = await qa_chain.ainvoke(user_query)
+        print(f"✅ LLM: {time.time() - start_time:.2f}s")
+
+        answer = await run_blocking(flask_server.postprocess_answer, answer)
+        await run_blocking(flask_server.cache_store, user_query, answer, model_type, embedding, domains)
+        return answer
+
+    key = flask_server.answer_key(user_query, model_type, domains)
+    return await flask_server.single_flight.arun(key, generate)
+
+
+async def ask(request):
+    print("📥 POST /ask - Processing question (async)")
+    try:
+        form = await request.form()
+        question = form.get("question")
+        gender = form.get("gender", "female")
+        model_type = form.get("model_type", "gdm")
+        responseWithAudio = form.get("responseWithAudio", False)
+        print(f"   Question: {question}")
+        print(f"   Model: {model_type}")
+        print(f"   Audio: {responseWithAudio}")
+
+        if not question:
+            print("❌ No question provided")
+            return PlainTextResponse("請輸入問題", status_code=400)
+
+        answer = await answer_question_async(question, model_type)
+
+        if responseWithAudio != "true":
+            return JSONResponse({"answer": answer})
+
+        start_time = time.time()
+        print("🎵 Generating audio...")
+        key = await run_blocking(flask_server.tts_cache.get_or_synthesize, answer, select_voice(gender))
+        print(f"✅ Audio: {time.time() - start_time:.2f}s")
+        response = {"answer": answer, "audio_url": f"{AUDIO_PREFIX}{key}.mp3"}
+        if form.get("audio_inline") == "true":
+            with open(flask_server.tts_cache.path(key), 'rb') as audio_file:
+                response["audio_base64"] = base64.b64encode(audio_file.read()).decode('utf-8')
+        return JSONResponse(response)
+
+    except LLMOverloaded as e:
+        print(f"⚠️  {str(e)}")
+        body, status, headers = flask_server.overloaded_response(e)
+        return JSONResponse(body, status_code=status, headers=headers)
+    except Exception as e:
+        print(f"❌ Error in ask: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return JSONResponse({"answer": f"處理問題時發生錯誤: {str(e)}"}, status_code=500)
+
+
+async def ask_stream(request):
+    """Server-Sent Events version of /ask, same events as the Flask route"""
+    print("📥 POST /ask/stream - Streaming answer (async)")
+    form = await request.form()
+    question = form.get("question")
+    model_type = form.get("model_type", "gdm")
+    with_audio = form.get("responseWithAudio", False) == "true"
+    voice = select_voice(form.get("gender", "female"))
+    print(f"   Question: {question}")
+    print(f"   Model: {model_type}")
+    print(f"   Audio: {with_audio}")
+
+    if not question:
+        print("❌ No question provided")
+        return PlainTextResponse("請輸入問題", status_code=400)
+
+    async def generate():
+        start_time = time.time()
+        first_token_time = None
+        parts = []
+        audio = SentenceAudioPipeline(flask_server.tts_executor, flask_server.tts_cache.get_or_synthesize, voice)
+
+        def audio_events(wait=False):
+            return [
+                sse_event({"index": index, "audio_url": f"{AUDIO_PREFIX}{key}.mp3"}, event="audio")
+                for index, key in audio.ready(wait)
+            ]
+
+        try:
+            domain, domains = await run_blocking(flask_server.route_question, question, model_type)
+            cached, embedding = flask_server.stored_answer(question, domain), None
+            if cached is None:
+                cached, embedding = await run_blocking(flask_server.cache_lookup, question, domain, domains)
+            if cached is not None:
+                segments = _once(cached)
+            else:
+                key = flask_server.answer_key(question, domain, domains)
+                if not flask_server.single_flight.in_flight(key):
+                    queue = llm_scheduler.estimate()
+                    llm_scheduler.check()
+                    if queue["position"]:
+                        yield sse_event(queue, event="queue")
+
+                async def produce():
+                    produced = []
+                    qa_chain = await run_blocking(flask_server.get_qa_chain, domain, domains)
+                    async for segment in astream_answer(qa_chain.astream(question), flask_server.cc):
+                        produced.append(segment)
+                        yield segment
+                    await run_blocking(flask_server.cache_store, question, "".join(produced), domain, embedding,
+                                       domains)
+
+                segments = flask_server.single_flight.astream(key, produce)
+            async for segment in segments:
+                if first_token_time is None:
+                    first_token_time = time.time() - start_time
+                    print(f"✅ First token: {first_token_time:.2f}s")
+                parts.append(segment)
+                yield sse_event({"text": segment}, event="token")
+                if with_audio:
+                    audio.feed(segment)
+                    for event in audio_events():
+                        yield event
+            print(f"✅ LLM stream: {time.time() - start_time:.2f}s")
+            if with_audio:
+                audio.flush()
+                while audio.pending:
+                    # Wait on the event loop instead of blocking it; a failed
+                    # synthesis is logged and skipped by audio.ready()
+                    await asyncio.wait([asyncio.wrap_future(audio.pending[0][1])])
+                    for event in audio_events():
+                        yield event
+                print(f"✅ Audio: {time.time() - start_time:.2f}s ({audio.count} sentences)")
+            yield sse_event({"answer": "".join(parts)}, event="done")
+        except LLMOverloaded as e:
+            print(f"⚠️  {str(e)}")
+            body, _, _ = flask_server.overloaded_response(e)
+            yield sse_event(body, event="error")
+        except Exception as e:
+            print(f"❌ Error in ask_stream: {str(e)}")
+            import traceback
+            traceback.print_exc()
+            yield sse_event({"answer": f"處理問題時發生錯誤: {str(e)}"}, event="error")
+        finally:
+            # Also runs when the client disconnects and the generator is closed
+            audio.cancel()
+
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return StreamingResponse(generate(), media_type="text/event-stream", headers=headers)
+
+
+async def ws_asr(websocket):
+    """Streaming voice input, same protocol as the Flask /ws/asr route"""
+    print("📥 WS /ws/asr - Streaming voice input (async)")
+    await websocket.accept()
+    transcriber = StreamingTranscriber(flask_server.asr_model, flask_server.cc)
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            if message.get("bytes") is not None:
+                for event in await run_blocking(transcriber.feed_pcm16, message["bytes"]):
+                    await websocket.send_text(json.dumps(event, ensure_ascii=False))
+            elif json.loads(message.get("text") or "{}").get("type") == "end":
+                start_time = time.time()
+                final = await run_blocking(transcriber.finish)
+                print(f"✅ Final transcript in {time.time() - start_time:.2f}s: {final['text']}")
+                await websocket.send_text(json.dumps(final, ensure_ascii=False))
+                await websocket.close()
+                break
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        print(f"❌ Error in ws_asr: {str(e)}")
+        try:
+            await websocket.send_text(json.dumps({"type": "error", "text": f"錯誤: {str(e)}"}, ensure_ascii=False))
+        except Exception:
+            pass
+
+
+async def on_startup():
+    # langchain's async retrievers fall back to run_in_executor(None, ...)
+    asyncio.get_running_loop().set_default_executor(blocking_executor)
+    # Runs in every worker, after the fork
+    flask_server.start_warmup()
+
+
+application = Starlette(
+    routes=[
+        Route("/ask", ask, methods=["POST"]),
+        Route("/ask/stream", ask_stream, methods=["POST"]),
+        WebSocketRoute("/ws/asr", ws_asr),
+        Mount("/", app=WSGIMiddleware(flask_server.app, workers=ASGI_WSGI_WORKERS)),
+    ],
+    on_startup=[on_startup],
+)
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""Benchmark ASR engines on a local set of recordings.
+
+Usage:
+  python asr_benchmark.py recordings_dir [--engines whisper faster-whisper] [--model-size medium]
+
+Behavior:
+  - Every audio file in recordings_dir (wav/webm/ogg/mp3/m4a) is decoded once
+    with asr_service.decode_audio.
+  - When a transcript <name>.txt exists next to <name>.wav it is used as the
+    reference for the character error rate (CER).
+  - Reports model load time, real-time factor (decode time / audio duration)
+    and CER per engine. Hypotheses are converted with OpenCC s2twp like /upload.
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+from asr_service import decode_audio, SAMPLE_RATE
+from asr_engines import ENGINES, ASR_MODEL_SIZE, ASR_BEAM_SIZE, load_asr_engine
+
+AUDIO_EXTENSIONS = {".wav", ".webm", ".ogg", ".mp3", ".m4a", ".flac"}
+
+
+def normalize_text(text):
+    """Keep letters and digits only, so punctuation does not count as errors"""
+    return "".join(ch for ch in text if ch.isalnum())
+
+
+def edit_distance(reference, hypothesis):
+    previous = list(range(len(hypothesis) + 1))
+    for i, ref_char in enumerate(reference, 1):
+        current = [i]
+        for j, hyp_char in enumerate(hypothesis, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1,
+                               previous[j - 1] + (ref_char != hyp_char)))
+        previous = current
+    return previous[-1]
+
+
+def load_recordings(directory):
+    recordings = []
+    for path in sorted(Path(directory).iterdir()):
+        if path.suffix.lower() not in AUDIO_EXTENSIONS:
+            continue
+        audio = decode_audio(path.read_bytes())
+        transcript = path.with_suffix(".txt")
+        reference = transcript.read_text(encoding="utf-8").strip() if transcript.exists() else None
+        recordings.append((path.name, audio, reference))
+    return recordings
+
+
+def benchmark(engine_name, recordings, converter, model_size, beam_size):
+    start_time = time.time()
+    engine = load_asr_engine(engine_name, model_size=model_size, beam_size=beam_size)
+    load_time = time.time() - start_time
+
+    # Warm-up so the first recording does not pay for lazy initialization
+    engine.transcribe(recordings[0][1])
+
+    audio_seconds = decode_seconds = 0.0
+    errors = reference_chars = 0
+    for name, audio, reference in recordings:
+        start_time = time.time()
+        text = converter.convert(engine.transcribe(audio))
+        elapsed = time.time() - start_time
+        audio_seconds += len(audio) / SAMPLE_RATE
+        decode_seconds += elapsed
+        if reference is not None:
+            expected = normalize_text(converter.convert(reference))
+            errors += edit_distance(expected, normalize_text(text))
+            reference_chars += len(expected)
+        print(f"[{engine_name}] {name}: {elapsed:.2f}s {text}")
+
+    return {
+        "engine": engine_name,
+        "load_time": load_time,
+        "rtf": decode_seconds / audio_seconds if audio_seconds else float("nan"),
+        "cer": errors / reference_chars if reference_chars else float("nan"),
+    }
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Benchmark ASR engines (RTF and CER)")
+    parser.add_argument("recordings_dir")
+    parser.add_argument("--engines", nargs="+", default=list(ENGINES), choices=list(ENGINES))
+    parser.add_argument("--model-size", default=ASR_MODEL_SIZE)
+    parser.add_argument("--beam-size", type=int, default=ASR_BEAM_SIZE)
+    args = parser.parse_args(argv[1:])
+
+    from opencc import OpenCC
+    converter = OpenCC('s2twp')
+
+    recordings = load_recordings(args.recordings_dir)
+    if not recordings:
+        print(f"No recordings found in {args.recordings_dir}")
+        return 2
+    total = sum(len(audio) for _, audio, _ in recordings) / SAMPLE_RATE
+    print(f"{len(recordings)} recordings, {total:.1f}s of audio")
+
+    results = [benchmark(engine, recordings, converter, args.model_size, args.beam_size) for engine in args.engines]
+
+    print(f"\n{'engine':<16} {'load s':>8} {'RTF':>8} {'CER':>8}")
+    for result in results:
+        print(f"{result['engine']:<16} {result['load_time']:>8.1f} {result['rtf']:>8.3f} {result['cer']:>8.3f}")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main(sys.argv))
@@ -0,0 +1,134 @@
+"""
+ASR engines behind the /upload endpoint.
+
+ASR_ENGINE selects the backend:
+  - whisper         openai-whisper in PyTorch (default, previous behaviour)
+  - faster-whisper  CTranslate2 backend, int8 by default (pip install faster-whisper)
+
+Both take 16 kHz mono float32 audio (see asr_service.decode_audio) and return
+the recognized text. Leading/trailing silence is trimmed first when
+ASR_VAD_TRIM is enabled, which shortens decoding for short utterances.
+"""
+
+import os
+
+from asr_service import trim_silence
+
+ASR_ENGINE = os.environ.get("ASR_ENGINE", "whisper")
+ASR_MODEL_SIZE = os.environ.get("ASR_MODEL_SIZE", "medium")
+ASR_BEAM_SIZE = int(os.environ.get("ASR_BEAM_SIZE", "1"))  # 1 = greedy decoding
+ASR_VAD_TRIM = os.environ.get("ASR_VAD_TRIM", "true").lower() == "true"
+ASR_DEVICE = os.environ.get("ASR_DEVICE", "auto")  # auto | cpu | cuda
+ASR_COMPUTE_TYPE = os.environ.get("ASR_COMPUTE_TYPE", "int8")  # faster-whisper only
+ASR_LANGUAGE = "zh"
+
+ENGINES = ("whisper", "faster-whisper")
+
+
+def _cuda_available():
+    try:
+        import torch
+        return torch.cuda.is_available()
+    except ImportError:
+        return False
+
+
+class ASREngine:
+    """Common interface: transcribe(audio) -> text"""
+
+    name = "base"
+
+    def __init__(self, model_size=ASR_MODEL_SIZE, beam_size=ASR_BEAM_SIZE, vad_trim=ASR_VAD_TRIM):
+        self.model_size = model_size
+        self.beam_size = beam_size
+        self.vad_trim = vad_trim
+
+    def prepare(self, audio):
+        return trim_silence(audio) if self.vad_trim else audio
+
+    def transcribe(self, audio, language=ASR_LANGUAGE):
+        audio = self.prepare(audio)
+        if len(audio) == 0:
+            return ""
+        return self._transcribe(audio, language).strip()
+
+    def transcribe_batch(self, audios, language=ASR_LANGUAGE):
+        """Transcribe several utterances; engines override this to share a forward pass"""
+        return [self.transcribe(audio, language) for audio in audios]
+
+    def _transcribe(self, audio, language):
+        raise NotImplementedError
+
+
+class WhisperEngine(ASREngine):
+    """openai-whisper (PyTorch)"""
+
+    name = "whisper"
+
+    def __init__(self, device=ASR_DEVICE, **kwargs):
+        super().__init__(**kwargs)
+        import whisper
+        self.device = ("cuda" if _cuda_available() else "cpu") if device == "auto" else device
+        self.model = whisper.load_model(self.model_size, device=self.device)
+
+    def _transcribe(self, audio, language):
+        beam_size = self.beam_size if self.beam_size > 1 else None
+        result = self.model.transcribe(audio, language=language, beam_size=beam_size,
+                                       fp16=self.device == "cuda")
+        return result["text"]
+
+    def transcribe_batch(self, audios, language=ASR_LANGUAGE):
+        """Utterances up to 30 s are padded and decoded together in one batch"""
+        import torch
+        import whisper
+
+        audios = [self.prepare(audio) for audio in audios]
+        texts = [""] * len(audios)
+        short = [i for i, audio in enumerate(audios) if 0 < len(audio) <= whisper.audio.N_SAMPLES]
+        for i, audio in enumerate(audios):
+            if len(audio) > whisper.audio.N_SAMPLES:
+                texts[i] = self._transcribe(audio, language).strip()
+        if len(short) == 1:
+            texts[short[0]] = self._transcribe(audios[short[0]], language).strip()
+        elif short:
+            mels = torch.stack([
+                whisper.log_mel_spectrogram(whisper.pad_or_trim(torch.from_numpy(audios[i])),
+                                            n_mels=self.model.dims.n_mels)
+                for i in short
+            ]).to(self.model.device)
+            options = whisper.DecodingOptions(language=language, without_timestamps=True,
+                                              beam_size=self.beam_size if self.beam_size > 1 else None,
+                                              fp16=self.device == "cuda")
+            results = whisper.decode(self.model, mels, options)
+            for i, result in zip(short, results):
+                texts[i] = result.text.strip()
+        return texts
+
+
+class FasterWhisperEngine(ASREngine):
+    """CTranslate2 Whisper (faster-whisper), int8 weights by default"""
+
+    name = "faster-whisper"
+
+    def __init__(self, device=ASR_DEVICE, compute_type=ASR_COMPUTE_TYPE, **kwargs):
+        super().__init__(**kwargs)
+        try:
+            from faster_whisper import WhisperModel
+        except ImportError as e:
+            raise RuntimeError("faster-whisper is required for ASR_ENGINE=faster-whisper. "
+                               "Install with: pip install faster-whisper") from e
+        self.device = ("cuda" if _cuda_available() else "cpu") if device == "auto" else device
+        self.model = WhisperModel(self.model_size, device=self.device, compute_type=compute_type)
+
+    def _transcribe(self, audio, language):
+        segments, _ = self.model.transcribe(audio, language=language, beam_size=self.beam_size)
+        return "".join(segment.text for segment in segments)
+
+
+def load_asr_engine(engine=ASR_ENGINE, **kwargs):
+    """Create the configured ASR engine"""
+    if engine == "whisper":
+        return WhisperEngine(**kwargs)
+    if engine == "faster-whisper":
+        return FasterWhisperEngine(**kwargs)
+    raise ValueError(f"Unknown ASR_ENGINE {engine!r}, expected one of {', '.join(ENGINES)}")
@@ -0,0 +1,127 @@
+"""
+In-memory audio decoding for Whisper.
+
+Uploads are decoded straight from the request bytes to 16 kHz mono float32,
+which is what whisper's transcribe() accepts as a NumPy array. PCM WAV is
+parsed in-process; other containers (webm/ogg from MediaRecorder) are piped
+through ffmpeg over stdin/stdout. Nothing is written to temp/, so concurrent
+uploads can no longer overwrite each other's recording.wav.
+"""
+
+import io
+import struct
+import subprocess
+
+import numpy as np
+
+SAMPLE_RATE = 16000
+# Energy-based trimming of leading/trailing silence
+VAD_FRAME_MS = 30
+VAD_THRESHOLD_DB = -40.0
+VAD_PAD_MS = 200
+
+_WAVE_FORMAT_PCM = 1
+_WAVE_FORMAT_IEEE_FLOAT = 3
+_WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+
+def _parse_wav(data):
+    """Return (samples float32 [frames, channels], sample_rate) or None if not PCM WAV"""
+    if len(data) < 12 or data[:4] != b"RIFF" or data[8:12] != b"WAVE":
+        return None
+    stream = io.BytesIO(data)
+    stream.seek(12)
+    fmt = None
+    while True:
+        header = stream.read(8)
+        if len(header) < 8:
+            return None
+        chunk_id, size = struct.unpack("<4sI", header)
+        if chunk_id == b"fmt ":
+            body = stream.read(size)
+            stream.seek(size & 1, io.SEEK_CUR)
+            format_tag, channels, sample_rate, _, _, bits = struct.unpack("<HHIIHH", body[:16])
+            if format_tag == _WAVE_FORMAT_EXTENSIBLE and len(body) >= 26:
+                format_tag = struct.unpack("<H", body[24:26])[0]
+            fmt = (format_tag, channels, sample_rate, bits)
+        elif chunk_id == b"data":
+            if fmt is None:
+                return None
+            # Some recorders write 0 or 0xFFFFFFFF as size while streaming
+            raw = stream.read(size if 0 < size < 0xFFFFFFFF else -1)
+            break
+        else:
+            stream.seek(size + (size & 1), io.SEEK_CUR)
+
+    format_tag, channels, sample_rate, bits = fmt
+    if format_tag == _WAVE_FORMAT_PCM and bits == 16:
+        samples = np.frombuffer(raw[:len(raw) - len(raw) % 2], dtype="<i2").astype(np.float32) / 32768.0
+    elif format_tag == _WAVE_FORMAT_PCM and bits == 32:
+        samples = np.frombuffer(raw[:len(raw) - len(raw) % 4], dtype="<i4").astype(np.float32) / 2147483648.0
+    elif format_tag == _WAVE_FORMAT_PCM and bits == 8:
+        samples = (np.frombuffer(raw, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+    elif format_tag == _WAVE_FORMAT_IEEE_FLOAT and bits == 32:
+        samples = np.frombuffer(raw[:len(raw) - len(raw) % 4], dtype="<f4").astype(np.float32)
+    else:
+        return None  # e.g. 24-bit or compressed WAV, let ffmpeg handle it
+    frames = len(samples) // max(1, channels)
+    return samples[:frames * channels].reshape(frames, channels), sample_rate
+
+
+def resample(audio, sample_rate, target_rate=SAMPLE_RATE):
+    """Linear-interpolation resampling, enough for speech recognition"""
+    if sample_rate == target_rate or len(audio) == 0:
+        return audio.astype(np.float32)
+    duration = len(audio) / sample_rate
+    target_length = int(round(duration * target_rate))
+    source_times = np.arange(len(audio)) / sample_rate
+    target_times = np.arange(target_length) / target_rate
+    return np.interp(target_times, source_times, audio).astype(np.float32)
+
+
+def _decode_with_ffmpeg(data):
+    """Decode any container ffmpeg understands, through pipes only"""
+    cmd = [
+        "ffmpeg", "-nostdin", "-threads", "0", "-i", "pipe:0",
+        "-f", "s16le", "-ac", "1", "-acodec", "pcm_s16le", "-ar", str(SAMPLE_RATE), "pipe:1",
+    ]
+    try:
+        out = subprocess.run(cmd, input=data, capture_output=True, check=True).stdout
+    except subprocess.CalledProcessError as e:
+        raise RuntimeError(f"Failed to decode audio: {e.stderr.decode(errors='ignore')[-300:]}") from e
+    return np.frombuffer(out, dtype=np.int16).astype(np.float32) / 32768.0
+
+
+def decode_audio(data):
+    """Decode uploaded bytes to 16 kHz mono float32"""
+    parsed = _parse_wav(data)
+    if parsed is None:
+        return _decode_with_ffmpeg(data)
+    samples, sample_rate = parsed
+    mono = samples.mean(axis=1) if samples.shape[1] > 1 else samples[:, 0]
+    return resample(mono, sample_rate)
+
+
+def frame_energy_db(audio, frame_ms=VAD_FRAME_MS, sample_rate=SAMPLE_RATE):
+    """RMS energy per frame in dBFS"""
+    frame = max(1, int(sample_rate * frame_ms / 1000))
+    count = len(audio) // frame
+    if count == 0:
+        return np.zeros(0, dtype=np.float32)
+    frames = audio[:count * frame].reshape(count, frame)
+    rms = np.sqrt(np.mean(frames ** 2, axis=1) + 1e-12)
+    return 20.0 * np.log10(rms)
+
+
+def trim_silence(audio, threshold_db=VAD_THRESHOLD_DB, frame_ms=VAD_FRAME_MS, pad_ms=VAD_PAD_MS,
+                 sample_rate=SAMPLE_RATE):
+    """Drop leading and trailing frames quieter than threshold_db, keeping pad_ms around speech"""
+    energy = frame_energy_db(audio, frame_ms, sample_rate)
+    voiced = np.nonzero(energy > threshold_db)[0]
+    if len(voiced) == 0:
+        return audio[:0]
+    frame = int(sample_rate * frame_ms / 1000)
+    pad = int(sample_rate * pad_ms / 1000)
+    start = max(0, voiced[0] * frame - pad)
+    end = min(len(audio), (voiced[-1] + 1) * frame + pad)
+    return audio[start:end]
@@ -0,0 +1,105 @@
+"""
+Incremental speech recognition for the /ws/asr WebSocket endpoint.
+
+The browser streams 16 kHz mono PCM16 while the user speaks. Audio is split
+into utterance segments with the energy VAD from asr_service: a segment is
+closed (and decoded once, for good) after ASR_STREAM_SILENCE_MS of silence,
+and the open segment is re-decoded every ASR_STREAM_PARTIAL_MS of new audio
+to produce partial transcripts. When the user stops only the last open
+segment still has to be decoded, so the final transcript is ready right away.
+"""
+
+import os
+
+import numpy as np
+
+from asr_service import SAMPLE_RATE, VAD_FRAME_MS, VAD_THRESHOLD_DB, VAD_PAD_MS, frame_energy_db
+
+ASR_STREAM_SILENCE_MS = int(os.environ.get("ASR_STREAM_SILENCE_MS", "600"))
+ASR_STREAM_PARTIAL_MS = int(os.environ.get("ASR_STREAM_PARTIAL_MS", "1000"))
+ASR_STREAM_MAX_SEGMENT_S = float(os.environ.get("ASR_STREAM_MAX_SEGMENT_S", "20"))
+
+
+class StreamingTranscriber:
+    """VAD-segmented incremental decoding over an ASR engine"""
+
+    def __init__(self, engine, converter, silence_ms=ASR_STREAM_SILENCE_MS,
+                 partial_ms=ASR_STREAM_PARTIAL_MS, max_segment_s=ASR_STREAM_MAX_SEGMENT_S,
+                 threshold_db=VAD_THRESHOLD_DB):
+        self.engine = engine
+        self.converter = converter
+        self.frame = int(SAMPLE_RATE * VAD_FRAME_MS / 1000)
+        self.silence_frames = max(1, silence_ms // VAD_FRAME_MS)
+        self.partial_frames = max(1, partial_ms // VAD_FRAME_MS)
+        self.preroll_frames = max(1, VAD_PAD_MS // VAD_FRAME_MS)
+        self.max_segment_frames = int(max_segment_s * 1000 / VAD_FRAME_MS)
+        self.threshold_db = threshold_db
+        self._remainder = np.zeros(0, dtype=np.float32)
+        self._segment = []
+        self._has_speech = False
+        self._silence = 0
+        self._since_partial = 0
+        self._committed = []
+
+    def _text(self, open_text=""):
+        return self.converter.convert("".join(self._committed) + open_text)
+
+    def _decode_segment(self):
+        if not self._segment:
+            return ""
+        return self.engine.transcribe(np.concatenate(self._segment), language="zh")
+
+    def _close_segment(self):
+        text = self._decode_segment()
+        if text:
+            self._committed.append(text)
+        self._segment = []
+        self._has_speech = False
+        self._silence = 0
+        self._since_partial = 0
+
+    def feed_pcm16(self, data):
+        """Consume little-endian PCM16 bytes, return the events to push to the client"""
+        samples = np.frombuffer(data[:len(data) - len(data) % 2], dtype="<i2").astype(np.float32) / 32768.0
+        return self.feed(samples)
+
+    def feed(self, samples):
+        events = []
+        audio = np.concatenate([self._remainder, samples])
+        count = len(audio) // self.frame
+        self._remainder = audio[count * self.frame:]
+        if count == 0:
+            return events
+        frames = audio[:count * self.frame].reshape(count, self.frame)
+        energies = frame_energy_db(audio[:count * self.frame])
+
+        for frame, energy in zip(frames, energies):
+            voiced = energy > self.threshold_db
+            self._segment.append(frame)
+            if not self._has_speech:
+                if voiced:
+                    self._has_speech = True
+                    self._since_partial = 0
+                else:
+                    # Keep a short pre-roll before speech starts
+                    self._segment = self._segment[-self.preroll_frames:]
+                continue
+
+            self._since_partial += 1
+            self._silence = 0 if voiced else self._silence + 1
+            if self._silence >= self.silence_frames or len(self._segment) >= self.max_segment_frames:
+                self._close_segment()
+                events.append({"type": "partial", "text": self._text()})
+            elif self._since_partial >= self.partial_frames:
+                self._since_partial = 0
+                events.append({"type": "partial", "text": self._text(self._decode_segment())})
+        return events
+
+    def finish(self):
+        """Decode whatever is still open and return the final transcript event"""
+        if self._remainder.size:
+            self._segment.append(self._remainder)
+            self._remainder = np.zeros(0, dtype=np.float32)
+        if self._has_speech:
+            self._close_segment()
+        return {"type": "final", "text": self._text()}
@@ -0,0 +1,149 @@
+"""
+Dedicated ASR worker with a bounded request queue.
+
+Concurrent /upload (and /ws/asr) requests no longer call the shared model at
+the same time. They are queued, short utterances that arrive together are
+decoded in one batched forward pass when the engine supports it, and when the
+queue is full callers get ASRQueueFull immediately (served as 503).
+"""
+
+import os
+import queue
+import threading
+import time
+
+ASR_QUEUE_MAX = int(os.environ.get("ASR_QUEUE_MAX", "16"))
+ASR_MAX_BATCH = int(os.environ.get("ASR_MAX_BATCH", "4"))
+ASR_BATCH_WAIT_MS = float(os.environ.get("ASR_BATCH_WAIT_MS", "20"))
+ASR_WORKERS = int(os.environ.get("ASR_WORKERS", "1"))
+
+
+class ASRQueueFull(Exception):
+    """Raised when the ASR queue is at capacity"""
+
+
+class _ASRRequest:
+    def __init__(self, audio, language):
+        self.audio = audio
+        self.language = language
+        self.enqueued = time.time()
+        self.queue_wait = None
+        self.decode_time = None
+        self.text = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class ASRWorker:
+    """Queue in front of an ASR engine; has the same transcribe() interface"""
+
+    def __init__(self, engine, max_queue=ASR_QUEUE_MAX, max_batch=ASR_MAX_BATCH,
+                 wait_ms=ASR_BATCH_WAIT_MS, workers=ASR_WORKERS):
+        self.engine = engine
+        self.max_batch = max_batch
+        self.wait = wait_ms / 1000.0
+        self.workers = workers
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._threads = []
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._completed = 0
+        self._rejected = 0
+        self._batches = 0
+        self._queue_wait_total = 0.0
+        self._decode_total = 0.0
+        self._queue_wait_max = 0.0
+        self._decode_max = 0.0
+
+    @property
+    def name(self):
+        return self.engine.name
+
+    def _ensure_started(self):
+        if self._threads:
+            return
+        with self._start_lock:
+            if not self._threads:
+                for index in range(self.workers):
+                    thread = threading.Thread(target=self._run, name=f"asr-worker-{index}", daemon=True)
+                    thread.start()
+                    self._threads.append(thread)
+
+    def submit(self, audio, language="zh"):
+        """Transcribe audio; returns (text, queue_wait, decode_time)"""
+        self._ensure_started()
+        request = _ASRRequest(audio, language)
+        try:
+            self._queue.put_nowait(request)
+        except queue.Full:
+            with self._stats_lock:
+                self._rejected += 1
+            raise ASRQueueFull(f"ASR queue is full ({self._queue.maxsize} requests)")
+        request.done.wait()
+        if request.error is not None:
+            raise request.error
+        return request.text, request.queue_wait, request.decode_time
+
+    def transcribe(self, audio, language="zh"):
+        return self.submit(audio, language)[0]
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(request)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            started = time.time()
+            for request in batch:
+                request.queue_wait = started - request.enqueued
+            try:
+                # Requests with the same language can share one forward pass
+                by_language = {}
+                for request in batch:
+                    by_language.setdefault(request.language, []).append(request)
+                for language, requests in by_language.items():
+                    texts = self.engine.transcribe_batch([request.audio for request in requests], language=language)
+                    for request, text in zip(requests, texts):
+                        request.text = text
+            except Exception as e:
+                for request in batch:
+                    request.error = e
+            decode_time = time.time() - started
+            with self._stats_lock:
+                self._batches += 1
+                for request in batch:
+                    request.decode_time = decode_time
+                    self._completed += 1
+                    self._queue_wait_total += request.queue_wait
+                    self._decode_total += decode_time
+                    self._queue_wait_max = max(self._queue_wait_max, request.queue_wait)
+                    self._decode_max = max(self._decode_max, decode_time)
+            for request in batch:
+                request.done.set()
+
+    def stats(self):
+        with self._stats_lock:
+            completed = self._completed
+            return {
+                "queue_depth": self._queue.qsize(),
+                "max_queue": self._queue.maxsize,
+                "completed": completed,
+                "rejected": self._rejected,
+                "batches": self._batches,
+                "avg_batch_size": completed / self._batches if self._batches else 0.0,
+                "avg_queue_wait": self._queue_wait_total / completed if completed else 0.0,
+                "max_queue_wait": self._queue_wait_max,
+                "avg_decode_time": self._decode_total / completed if completed else 0.0,
+                "max_decode_time": self._decode_max,
+            }
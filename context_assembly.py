@@ -0,0 +1,150 @@
+"""
+Context assembly between the reranker and the qwen3 prompt.
+
+Without it the prompt received the list of Document objects as {context},
+repr and metadata included. The reranked passages are now:
+
+  - dropped below CONTEXT_MIN_SCORE (reranker relevance, 0..1; the best
+    passage is always kept)
+  - deduplicated: a passage mostly contained in a better one is dropped, and
+    the text a chunk shares with its neighbour (ingest chunk overlap) is cut
+  - formatted compactly as "[1] text" blocks
+  - cut at CONTEXT_TOKEN_BUDGET estimated tokens
+
+The score threshold and the budget are off by default: they change which
+passages reach qwen3, so set them only after checking answer quality on the
+question banks. Formatting and deduplication do not drop information.
+
+Prompt tokens and prefill time actually evaluated by Ollama are reported per
+request by ScheduledChatOllama (see shared_models.py) and summed up in
+prompt_stats for /metrics.
+"""
+
+import math
+import os
+import re
+import threading
+
+# Estimated tokens of context, 0 disables the budget
+CONTEXT_TOKEN_BUDGET = int(os.environ.get("CONTEXT_TOKEN_BUDGET", "0"))
+# Minimum reranker relevance, 0 keeps every reranked passage
+CONTEXT_MIN_SCORE = float(os.environ.get("CONTEXT_MIN_SCORE", "0"))
+# Share of a passage's character bigrams found in a better passage to count as a duplicate
+CONTEXT_DUPLICATE_OVERLAP = float(os.environ.get("CONTEXT_DUPLICATE_OVERLAP", "0.8"))
+# Shortest shared chunk boundary (characters) that is cut from the next passage
+_MIN_BOUNDARY_OVERLAP = 20
+_MAX_BOUNDARY_OVERLAP = 300
+
+_CJK = re.compile(r"[\u3400-\u9fff\uf900-\ufaff\u3000-\u303f\uff00-\uffef]")
+_SPACES = re.compile(r"[ \t\u3000]+")
+_BLANK_LINES = re.compile(r"\n{3,}")
+
+
+def estimate_tokens(text):
+    """Rough qwen3 token count: one per CJK character, one per four other characters"""
+    cjk = len(_CJK.findall(text))
+    return cjk + math.ceil((len(text) - cjk) / 4)
+
+
+def _bigrams(text):
+    return {text[i:i + 2] for i in range(len(text) - 1)}
+
+
+def _boundary_overlap(previous, text):
+    """Length of the longest prefix of text that previous ends with"""
+    for length in range(min(len(previous), len(text), _MAX_BOUNDARY_OVERLAP), _MIN_BOUNDARY_OVERLAP - 1, -1):
+        if previous.endswith(text[:length]):
+            return length
+    return 0
+
+
+class ContextAssembler:
+    """Turns reranked documents into the {context} string of the RAG prompt"""
+
+    def __init__(self, budget=CONTEXT_TOKEN_BUDGET, min_score=CONTEXT_MIN_SCORE,
+                 duplicate_overlap=CONTEXT_DUPLICATE_OVERLAP, label=""):
+        self.budget = budget
+        self.min_score = min_score
+        self.duplicate_overlap = duplicate_overlap
+        self.label = label
+
+    def passages(self, documents):
+        """(passages, dropped counts) after the score, duplicate and budget filters"""
+        dropped = {"score": 0, "duplicate": 0, "budget": 0}
+        kept, kept_bigrams = [], []
+        used = 0
+        for document in documents:
+            score = document.metadata.get("relevance_score")
+            if kept and score is not None and score < self.min_score:
+                dropped["score"] += 1
+                continue
+            text = _BLANK_LINES.sub("\n\n", _SPACES.sub(" ", document.page_content)).strip()
+            for previous in kept:
+                overlap = _boundary_overlap(previous, text)
+                if overlap:
+                    text = text[overlap:].strip()
+                    break
+            bigrams = _bigrams(text)
+            if not bigrams or any(len(bigrams & other) >= self.duplicate_overlap * len(bigrams)
+                                  for other in kept_bigrams):
+                dropped["duplicate"] += 1
+                continue
+            tokens = estimate_tokens(text)
+            if self.budget > 0 and used + tokens > self.budget:
+                if kept:
+                    dropped["budget"] += 1
+                    continue
+                # The best passage is always used, cut to the budget
+                text = text[:max(1, int(len(text) * self.budget / tokens))]
+                tokens = estimate_tokens(text)
+            kept.append(text)
+            kept_bigrams.append(bigrams)
+            used += tokens
+        return kept, dropped
+
+    def format(self, documents):
+        documents = list(documents)
+        passages, dropped = self.passages(documents)
+        context = "\n\n".join(f"[{number}] {text}" for number, text in enumerate(passages, 1))
+        skipped = ", ".join(f"{count} {reason}" for reason, count in dropped.items() if count)
+        print(f"📄 Context{f' [{self.label}]' if self.label else ''}: {len(passages)}/{len(documents)} passages, "
+              f"~{estimate_tokens(context)} tokens{f' (dropped {skipped})' if skipped else ''}")
+        return context
+
+
+class PromptStats:
+    """Prompt tokens and prefill time reported by Ollama"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.prompt_tokens = 0
+        self.prefill_seconds = 0.0
+        self.last = None
+
+    def record(self, generation_info):
+        """Record the final generation_info of a ChatOllama call; ignores partial chunks"""
+        if not generation_info or "prompt_eval_count" not in generation_info:
+            return
+        tokens = int(generation_info.get("prompt_eval_count") or 0)
+        prefill = (generation_info.get("prompt_eval_duration") or 0) / 1e9
+        print(f"📏 Prompt: {tokens} tokens evaluated, prefill {prefill:.2f}s")
+        with self._lock:
+            self.requests += 1
+            self.prompt_tokens += tokens
+            self.prefill_seconds += prefill
+            self.last = {"prompt_tokens": tokens, "prefill_seconds": round(prefill, 3)}
+
+    def stats(self):
+        with self._lock:
+            requests = max(self.requests, 1)
+            return {
+                "requests": self.requests,
+                "avg_prompt_tokens": round(self.prompt_tokens / requests, 1),
+                "avg_prefill_seconds": round(self.prefill_seconds / requests, 3),
+                "last": self.last,
+                "budget": CONTEXT_TOKEN_BUDGET,
+            }
+
+
+prompt_stats = PromptStats()
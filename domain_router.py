@@ -0,0 +1,90 @@
+"""
+Automatic domain selection for model_type=auto.
+
+The question is scored against the question bank of every domain, using the
+bge-m3 bank embeddings related_questions.py already keeps and the query
+embedding that retrieval computes anyway (CachingEmbeddings turns the second
+embed_query of the same text into a cache hit), so routing adds no model call,
+only one matrix product per domain.
+
+A domain scores the mean cosine similarity of its ROUTER_TOP_K closest bank
+questions. When the best domain leads the runner-up by at least ROUTER_MARGIN
+the question goes to that domain alone; otherwise the ROUTER_FANOUT best
+domains are retrieved in parallel and their candidates reranked together
+(see DomainRegistry.fanout).
+
+DOMAIN_ROUTING:
+  - auto    route model_type=auto and unknown model_types (default)
+  - always  route every question, the client's model_type is ignored
+  - off     model_type=auto falls back to the default domain
+"""
+
+import os
+import threading
+
+import numpy as np
+
+DOMAIN_ROUTING = os.environ.get("DOMAIN_ROUTING", "auto")  # auto | always | off
+ROUTER_TOP_K = int(os.environ.get("ROUTER_TOP_K", "3"))
+ROUTER_MARGIN = float(os.environ.get("ROUTER_MARGIN", "0.05"))
+ROUTER_FANOUT = int(os.environ.get("ROUTER_FANOUT", "2"))
+AUTO_DOMAIN = "auto"
+
+
+class DomainRouter:
+    """Nearest question bank classifier over the domains of a registry"""
+
+    def __init__(self, embeddings, bank, mode=DOMAIN_ROUTING, top_k=ROUTER_TOP_K,
+                 margin=ROUTER_MARGIN, fanout=ROUTER_FANOUT):
+        """bank(domain) returns the question bank embeddings of a domain (related_questions._Bank)"""
+        self.embeddings = embeddings
+        self.bank = bank
+        self.mode = mode
+        self.top_k = top_k
+        self.margin = margin
+        self.fanout = max(1, fanout)
+        self._lock = threading.Lock()
+        self._routed = {}
+        self._fanouts = 0
+
+    def should_route(self, model_type, names):
+        if self.mode == "always":
+            return True
+        if self.mode == "off":
+            return False
+        return model_type == AUTO_DOMAIN or model_type not in names
+
+    def scores(self, question, names):
+        """{domain: mean similarity of its top_k closest bank questions}"""
+        query = np.asarray(self.embeddings.embed_query(question), dtype=np.float32)
+        query /= max(float(np.linalg.norm(query)), 1e-12)
+        scores = {}
+        for name in names:
+            matrix = self.bank(name).matrix
+            if not len(matrix):
+                continue
+            similarities = matrix @ query
+            k = min(self.top_k, len(similarities))
+            scores[name] = float(np.partition(similarities, -k)[-k:].mean())
+        return scores
+
+    def route(self, question, names):
+        """(domains, margin): one domain when confident, else the fanout best ones"""
+        scores = self.scores(question, names)
+        if not scores:
+            return list(names[:1]), 0.0
+        ranked = sorted(scores, key=scores.get, reverse=True)
+        margin = scores[ranked[0]] - scores[ranked[1]] if len(ranked) > 1 else 1.0
+        domains = ranked[:1] if margin >= self.margin else ranked[:self.fanout]
+        with self._lock:
+            key = "+".join(domains)
+            self._routed[key] = self._routed.get(key, 0) + 1
+            if len(domains) > 1:
+                self._fanouts += 1
+        scored = ", ".join(f"{name}={scores[name]:.3f}" for name in ranked)
+        print(f"🧭 Route → {'+'.join(domains)} (margin {margin:.3f}; {scored}): {question[:30]}")
+        return domains, margin
+
+    def stats(self):
+        with self._lock:
+            return {"mode": self.mode, "routed": dict(self._routed), "fanouts": self._fanouts}
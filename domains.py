@@ -0,0 +1,394 @@
+"""
+Declarative registry of the RAG domains (specialties).
+
+Every domain is one config entry: FAISS index path, prompt template, retriever
+k, reranker top_n and question bank file. Chains are built on first use (or in
+the background, see model_manager.py), cached, and domains that have not been
+used for DOMAIN_IDLE_TIMEOUT seconds are unloaded to free memory.
+
+Extra domains can be added without code changes through a JSON file given by
+DOMAINS_CONFIG, e.g. {"dietitian": {"faiss_path": "...", "prompt_file": "...",
+"question_file": "..."}}.
+"""
+
+import asyncio
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, List
+
+from langchain_community.vectorstores import FAISS
+from langchain_core.callbacks import CallbackManagerForRetrieverRun, AsyncCallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.runnables import RunnableLambda, RunnablePassthrough
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import ChatPromptTemplate, SystemMessagePromptTemplate, HumanMessagePromptTemplate
+from langchain_classic.retrievers.contextual_compression import ContextualCompressionRetriever
+
+from context_assembly import ContextAssembler, CONTEXT_TOKEN_BUDGET
+from hybrid_retrieval import HybridRetriever, load_bm25
+from index_store import read_docstore, resolve_index_dir
+
+# Import shared models
+from shared_models import shared_embeddings, shared_chat_model, get_compressor
+
+DEFAULT_DOMAIN = "gdm"
+# Seconds without a request before a loaded domain is unloaded, 0 disables it
+DOMAIN_IDLE_TIMEOUT = float(os.environ.get("DOMAIN_IDLE_TIMEOUT", "0"))
+DOMAINS_CONFIG = os.environ.get("DOMAINS_CONFIG", "")
+# dense: FAISS top-k only; hybrid: FAISS + BM25 fused with RRF (see hybrid_retrieval.py)
+RETRIEVAL_MODE = os.environ.get("RETRIEVAL_MODE", "hybrid")
+# Fused candidates passed to the cross-encoder in hybrid mode (dense mode reranks all k).
+# Same as k by default; lower it only after comparing recall against dense retrieval
+HYBRID_CANDIDATES = int(os.environ.get("HYBRID_CANDIDATES", "10"))
+# Memory-map index.faiss read-only, so worker processes share the pages
+FAISS_MMAP = os.environ.get("FAISS_MMAP", "true").lower() == "true"
+
+# The static guidelines of a domain are its system message and come first, the
+# retrieved context and the question follow in the user message, so every
+# request of a domain shares the same prompt prefix and Ollama can reuse its
+# KV cache instead of prefilling the guidelines again.
+RAG_TEMPLATE = """
+##檢索上下文(Retrieved Context):
+{context}
+
+根據以上資訊，請回答：{question}
+"""
+
+GDM_SYSTEM_PROMPT = """
+##指導方針：
+你是一位專精在妊娠期糖尿病的營養師及藥劑師，能在保持技術準確性的同時，以對話回應問題。
+你的任務是當醫生向你提問時，根據檢索上下文中的資訊回答醫生的問題。
+檢索上下文當中含有範例問題及回答，你必須對範例回答稍加修飾後輸出。
+
+你必須嚴格遵循以下指導方針：
+**你必須優先根據檢索上下文中的資訊回答問題。
+**注意回答的篇幅，不需要太長。
+**針對問題直接提供問題的解答，避免任何不必要的資訊。
+**在使用專有名詞時，必須採用和問題中一樣的說法。
+**確保回答內容清晰且精確，並保持專業語氣。
+**避免重複，並優先確保內容連貫，清晰地解釋觀點。
+**當問題中有出現個別病患的狀況時，必須先總結患者的狀況或該狀況所代表的涵義。
+**當沒有明確指示時，你可以假設問題中出現的患者指的是妊娠期糖尿病患者。
+**你說話的對象是醫生，所以你的回應不能要求要與營養師或醫師討論。
+**使用繁體中文回答。
+"""
+
+CKD_SYSTEM_PROMPT = """
+##指導方針：
+你是一位專精在慢性腎臟病的營養師及藥劑師，能在保持技術準確性的同時，以對話回應問題。
+你的任務是當醫生向你提問時，根據檢索上下文中的資訊回答醫生的問題。
+檢索上下文當中含有範例問題及回答，你必須對範例回答稍加修飾後輸出。
+
+你必須嚴格遵循以下指導方針：
+**你必須優先根據檢索上下文中的資訊回答問題。
+**注意回答的篇幅，不需要過長。
+**針對問題直接提供問題的解答，避免任何不必要的資訊。
+**在使用專有名詞時，必須採用和問題中一樣的說法。
+**確保回答內容清晰且精確，並保持專業語氣。
+**避免重複，並優先確保內容連貫，清晰地解釋觀點。
+**當問題中有出現個別病患的狀況時，必須先總結患者的狀況或該狀況所代表的涵義。
+**當沒有明確指示時，你可以假設問題中出現的患者指的是慢性腎臟病患者。
+**你說話的對象是醫生，所以你的回應不能要求要與營養師或醫師討論。
+**使用繁體中文回答。
+"""
+
+PPD_SYSTEM_PROMPT = """
+##指導方針：
+你是一位專精在產後憂鬱症的心理諮商師及藥劑師，能在保持技術準確性的同時，以對話回應問題。
+你的任務是當病患向你提問時，根據檢索上下文中的資訊回答病患的問題。
+檢索上下文當中含有範例問題及回答，你必須對範例回答稍加修飾後輸出。
+
+你必須嚴格遵循以下指導方針：
+**你必須優先根據檢索上下文中的資訊回答問題。
+**注意回答的篇幅，不需要太長。
+**針對問題直接提供問題的解答，避免任何不必要的資訊。
+**在使用專有名詞時，必須採用和問題中一樣的說法。
+**確保回答內容清晰且精確，並保持專業語氣。
+**避免重複，並優先確保內容連貫，清晰地解釋觀點。
+**當問題中有出現個別病患的狀況時，必須先總結患者的狀況或該狀況所代表的涵義。
+**當沒有明確指示時，你可以假設問題中出現的患者指的是產後憂鬱症患者。
+**使用繁體中文回答。
+"""
+
+# related question generate
+RELATED_QUESTION_SYSTEM_PROMPT = """
+You are an assistant specializing in question generation, capable of producing multiple relevant and in-depth follow-up questions based on user input. Your goal is to expand the scope of the user's query and cover various aspects of the related field. Please adhere to the following guidelines:
+
+Guidelines:
+Question Expansion: Each follow-up question should be closely related to the user's input topic but explore the subject from different angles or levels.
+Diversity: Avoid generating overly similar questions. Ensure that the follow-up questions demonstrate diversity in approach and focus.
+Specificity: The questions should be specific and actionable, helping the user gain a deeper understanding or exploration of the topic.
+Quantity: Generate at least five follow-up questions each time.
+Examples:
+User Input: "2024 Summer Olympics"
+Follow-up Questions:
+
+What new events will be introduced in the 2024 Summer Olympics?
+What are the specific dates for the opening and closing ceremonies of the 2024 Olympics?
+What changes have been made to the schedule of the 2024 Olympics?
+What are the specific events for breakdancing in the 2024 Olympics?
+Where will the surfing competitions of the 2024 Olympics take place?
+User Input: "How to create charts with Python"
+Follow-up Questions:
+
+How can you use Python to create scatter plots?
+What other visualization libraries are available in Python?
+How do you create line charts in Python?
+What are the common issues encountered when creating charts in Python?
+How can you add titles and axis labels to charts in Python?
+Please follow the above rules to generate relevant follow-up questions based on user input. Do not answer the questions.
+Respond in the language specified by the user or the language of the query provided.
+"""
+
+DOMAINS = {
+    "gdm": {
+        "label": "GDM",  # 妊娠期糖尿病
+        "faiss_path": "faiss_index_document_GDM",
+        "system_prompt": GDM_SYSTEM_PROMPT,
+        "prompt_template": RAG_TEMPLATE,
+        "k": 10,
+        "top_n": 5,
+        "question_file": "gdm_questions.txt",
+    },
+    "ckd": {
+        "label": "CKD",  # 慢性腎臟病
+        "faiss_path": "faiss_index_document_ckd",
+        "system_prompt": CKD_SYSTEM_PROMPT,
+        "prompt_template": RAG_TEMPLATE,
+        "k": 10,
+        "top_n": 5,
+        "question_file": "ckd_questions.txt",
+    },
+    "ppd": {
+        "label": "PPD",  # 產後憂鬱症
+        "faiss_path": "faiss_index_document_ppd",
+        "system_prompt": PPD_SYSTEM_PROMPT,
+        "prompt_template": RAG_TEMPLATE,
+        "k": 10,
+        "top_n": 5,
+        "question_file": "ppd_questions.txt",
+    },
+}
+
+
+def prompt_text(config):
+    """System prompt and template of a domain, for answer versioning"""
+    return config.get("system_prompt", "") + config["prompt_template"]
+
+
+def load_domain_config(path):
+    """Read extra domains from a JSON file; prompt_file is read into prompt_template and
+    system_prompt_file into system_prompt (the template then only needs {context} and {question})"""
+    with open(path, "r", encoding="utf-8") as f:
+        extra = json.load(f)
+    domains = {}
+    for name, config in extra.items():
+        config = dict(config)
+        if "prompt_file" in config:
+            with open(config.pop("prompt_file"), "r", encoding="utf-8") as f:
+                config["prompt_template"] = f.read()
+        if "system_prompt_file" in config:
+            with open(config.pop("system_prompt_file"), "r", encoding="utf-8") as f:
+                config["system_prompt"] = f.read()
+            config.setdefault("prompt_template", RAG_TEMPLATE)
+        config.setdefault("label", name.upper())
+        config.setdefault("k", 10)
+        config.setdefault("top_n", 5)
+        domains[name] = config
+    return domains
+
+
+def build_related_question_chain():
+    # Combine system and human prompt templates
+    system_prompt = SystemMessagePromptTemplate.from_template(RELATED_QUESTION_SYSTEM_PROMPT)
+    human_prompt = HumanMessagePromptTemplate.from_template("{user_input}")
+    prompt = ChatPromptTemplate.from_messages([system_prompt, human_prompt])
+    # Create related question chain using shared chat model
+    return prompt | shared_chat_model
+
+
+def load_vector_store(faiss_path, embeddings, index_name="index"):
+    """FAISS store over index.faiss (memory-mapped read-only when FAISS_MMAP is set) and its docstore.
+
+    Indexes built by ingest.py use docstore.sqlite and are not unpickled at all;
+    older directories fall back to index.pkl (see index_store.py).
+    """
+    import faiss
+    faiss_path = resolve_index_dir(faiss_path)
+    path = os.path.join(faiss_path, f"{index_name}.faiss")
+    index = None
+    if FAISS_MMAP:
+        # IO_FLAG_MMAP_IFC (faiss >= 1.9) also maps the codes of flat indexes
+        flags = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY | getattr(faiss, "IO_FLAG_MMAP_IFC", 0)
+        try:
+            index = faiss.read_index(path, flags)
+        except RuntimeError as e:
+            print(f"⚠️  Cannot memory-map {faiss_path}, loading it into memory: {e}")
+    if index is None:
+        index = faiss.read_index(path)
+    docstore, index_to_docstore_id = read_docstore(faiss_path, index_name)
+    return FAISS(embeddings, index, docstore, index_to_docstore_id)
+
+
+def build_qa_chain(retriever, config):
+    """(compression_retriever, qa_chain) over the candidates of retriever"""
+    # Use shared compressor for contextual compression
+    compression_retriever = ContextualCompressionRetriever(
+        base_compressor=get_compressor(config["top_n"]), base_retriever=retriever
+    )
+
+    # Reranked documents become a compact, deduplicated context within the token budget
+    assembler = ContextAssembler(budget=config.get("context_budget", CONTEXT_TOKEN_BUDGET),
+                                 label=config.get("label", ""))
+
+    # Create QA chain using shared chat model
+    if config.get("system_prompt"):
+        rag_prompt = ChatPromptTemplate.from_messages([
+            SystemMessagePromptTemplate.from_template(config["system_prompt"]),
+            HumanMessagePromptTemplate.from_template(config["prompt_template"]),
+        ])
+    else:
+        rag_prompt = ChatPromptTemplate.from_template(config["prompt_template"])
+    qa_chain = (
+        {"context": compression_retriever | RunnableLambda(assembler.format), "question": RunnablePassthrough()}
+        | rag_prompt
+        | shared_chat_model
+        | StrOutputParser()
+    )
+    return compression_retriever, qa_chain
+
+
+def _merge_candidates(results):
+    """Interleave the candidate lists of several domains, dropping duplicate chunks"""
+    documents, seen = [], set()
+    for rank in range(max((len(result) for result in results), default=0)):
+        for result in results:
+            if rank < len(result) and result[rank].page_content not in seen:
+                seen.add(result[rank].page_content)
+                documents.append(result[rank])
+    return documents
+
+
+class FanOutRetriever(BaseRetriever):
+    """Candidates of several domain retrievers, searched in parallel, for one rerank"""
+
+    retrievers: List[Any]
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        with ThreadPoolExecutor(max_workers=len(self.retrievers), thread_name_prefix="fanout") as executor:
+            results = list(executor.map(lambda retriever: retriever.invoke(query), self.retrievers))
+        return _merge_candidates(results)
+
+    async def _aget_relevant_documents(self, query: str, *,
+                                       run_manager: AsyncCallbackManagerForRetrieverRun) -> List[Document]:
+        results = await asyncio.gather(*(retriever.ainvoke(query) for retriever in self.retrievers))
+        return _merge_candidates(results)
+
+
+def build_domain(config):
+    """Load the FAISS index of a domain and build its retrieval chains"""
+    # Load vector store with shared embeddings
+    faiss_path = resolve_index_dir(config["faiss_path"])
+    vector_store = load_vector_store(faiss_path, shared_embeddings)
+    print(f"[{config['label']}] Loaded FAISS vector store from: {faiss_path}, id={id(vector_store)}")
+
+    # Create retriever
+    if config.get("retrieval", RETRIEVAL_MODE) == "hybrid":
+        retriever = HybridRetriever(
+            vector_store=vector_store,
+            bm25=load_bm25(vector_store, faiss_path),
+            dense_k=config["k"],
+            sparse_k=config["k"],
+            k=config.get("candidates", HYBRID_CANDIDATES),
+        )
+    else:
+        retriever = vector_store.as_retriever(search_type="similarity", search_kwargs={"k": config["k"]})
+
+    compression_retriever, qa_chain = build_qa_chain(retriever, config)
+
+    return {
+        "vector_store": vector_store,
+        "retriever": retriever,
+        "compression_retriever": compression_retriever,
+        "qa_chain": qa_chain,
+        "related_question_chain": build_related_question_chain(),
+    }
+
+
+class DomainRegistry:
+    """Builds domain chains on demand through the model manager and unloads idle ones"""
+
+    def __init__(self, manager, domains=None, idle_timeout=DOMAIN_IDLE_TIMEOUT):
+        self.manager = manager
+        self.idle_timeout = idle_timeout
+        self.domains = {}
+        self._last_used = {}
+        self._reaper = None
+        for name, config in (domains or DOMAINS).items():
+            self.register(name, config)
+        if domains is None and DOMAINS_CONFIG:
+            for name, config in load_domain_config(DOMAINS_CONFIG).items():
+                self.register(name, config)
+
+    def register(self, name, config):
+        self.domains[name] = config
+        self.manager.register(self.component(name), lambda: build_domain(config))
+
+    @staticmethod
+    def component(name):
+        return f"index_{name}"
+
+    def names(self):
+        return list(self.domains)
+
+    def resolve(self, model_type):
+        """Unknown model_type falls back to the default domain"""
+        return model_type if model_type in self.domains else DEFAULT_DOMAIN
+
+    def config(self, model_type):
+        return self.domains[self.resolve(model_type)]
+
+    def get(self, model_type):
+        """Chains of a domain, loading the domain if needed"""
+        name = self.resolve(model_type)
+        self._last_used[name] = time.time()
+        return self.manager.get(self.component(name))
+
+    def fanout(self, names):
+        """qa_chain over the merged candidates of several domains, with the prompt of the first.
+
+        Built per call from the loaded domains; it only composes existing objects.
+        """
+        retrievers = [self.get(name)["retriever"] for name in names]
+        _, qa_chain = build_qa_chain(FanOutRetriever(retrievers=retrievers), self.config(names[0]))
+        return qa_chain
+
+    def unload_idle(self):
+        if self.idle_timeout <= 0:
+            return []
+        now = time.time()
+        unloaded = []
+        for name in self.domains:
+            component = self.component(name)
+            if self.manager.is_loaded(component) and now - self._last_used.get(name, now) > self.idle_timeout:
+                self.manager.unload(component)
+                unloaded.append(name)
+                print(f"♻️  Unloaded idle domain: {name}")
+        return unloaded
+
+    def start_reaper(self):
+        """Background thread that periodically unloads idle domains"""
+        if self.idle_timeout <= 0 or self._reaper is not None:
+            return
+
+        def run():
+            while True:
+                time.sleep(max(1.0, self.idle_timeout / 4))
+                self.unload_idle()
+
+        self._reaper = threading.Thread(target=run, name="domain-reaper", daemon=True)
+        self._reaper.start()
@@ -0,0 +1,273 @@
+"""
+Caching and batching wrapper around the bge-m3 Ollama embeddings.
+
+Every retrieval used to call OllamaEmbeddings.embed_query as its own HTTP
+round-trip, and the same query was embedded again on retries and by the
+semantic cache. CachingEmbeddings adds:
+  - an in-process LRU of query embeddings
+  - an optional on-disk store (memory-mapped float32 matrix + key file)
+  - a batching mode that coalesces concurrent embed_query misses into one
+    embed_documents request
+
+Cache keys hash the wrapped model name together with the text, so vectors of
+a previous embedding model (e.g. another bge-m3 tag) in EMBED_CACHE_DIR are
+never returned after the model changes.
+"""
+
+import fcntl
+import hashlib
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+EMBED_CACHE = os.environ.get("EMBED_CACHE", "true").lower() == "true"
+EMBED_CACHE_MAX_ENTRIES = int(os.environ.get("EMBED_CACHE_MAX_ENTRIES", "10000"))
+# Directory of the memory-mapped store, empty to keep embeddings in memory only
+EMBED_CACHE_DIR = os.environ.get("EMBED_CACHE_DIR", "")
+EMBED_BATCHING = os.environ.get("EMBED_BATCHING", "true").lower() == "true"
+EMBED_MAX_BATCH = int(os.environ.get("EMBED_MAX_BATCH", "16"))
+EMBED_BATCH_WAIT_MS = float(os.environ.get("EMBED_BATCH_WAIT_MS", "5"))
+
+
+def text_key(text, model=""):
+    return hashlib.sha1(f"{model}\0{text}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingDiskStore:
+    """Append-only float32 matrix (vectors.f32) with a key -> row file (keys.tsv).
+
+    Several processes may share the directory (gunicorn workers): appends hold
+    an fcntl lock on store.lock, the row is derived from the size of
+    vectors.f32 and written into the keys.tsv line, and rows appended by other
+    processes are picked up on a miss. A crash between the two appends only
+    leaves an unreferenced vector behind.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.vectors_path = os.path.join(directory, "vectors.f32")
+        self.keys_path = os.path.join(directory, "keys.tsv")
+        self.lock_path = os.path.join(directory, "store.lock")
+        self.dim = None
+        self._rows = {}
+        self._keys_offset = 0
+        self._matrix = None
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        with self._lock:
+            self._refresh()
+        if self._rows:
+            print(f"✅ Embedding store loaded {len(self._rows)} vectors from {self.directory}")
+
+    def _refresh(self):
+        """Read the complete keys.tsv lines appended since the last read"""
+        try:
+            with open(self.keys_path, "rb") as f:
+                f.seek(self._keys_offset)
+                data = f.read()
+        except FileNotFoundError:
+            return
+        end = data.rfind(b"\n") + 1
+        for line in data[:end].decode("utf-8").splitlines():
+            parts = line.split("\t")
+            if len(parts) != 3 or not parts[1].isdigit() or not parts[2].isdigit():
+                continue
+            key, row, dim = parts
+            if self.dim is None:
+                self.dim = int(dim)
+            if int(dim) == self.dim:
+                self._rows[key] = int(row)
+        self._keys_offset += end
+
+    def _mapped(self, row):
+        # Re-map when rows were appended after the current mapping was created
+        if self._matrix is None or self._matrix.shape[0] <= row:
+            self._matrix = np.memmap(self.vectors_path, dtype=np.float32, mode="r")
+            self._matrix = self._matrix[:len(self._matrix) // self.dim * self.dim].reshape(-1, self.dim)
+        return self._matrix
+
+    def get(self, key):
+        with self._lock:
+            row = self._rows.get(key)
+            if row is None:
+                self._refresh()
+                row = self._rows.get(key)
+                if row is None:
+                    return None
+            matrix = self._mapped(row)
+            if row >= matrix.shape[0]:
+                return None
+            return np.array(matrix[row]).tolist()
+
+    def put(self, key, vector):
+        vector = np.asarray(vector, dtype=np.float32)
+        with self._lock:
+            if key in self._rows:
+                return
+            with open(self.lock_path, "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    self._refresh()
+                    if key in self._rows:
+                        return
+                    if self.dim is None:
+                        self.dim = int(vector.shape[0])
+                    if vector.shape[0] != self.dim:
+                        return
+                    row_bytes = self.dim * 4
+                    with open(self.vectors_path, "ab") as f:
+                        size = f.seek(0, os.SEEK_END)
+                        if size % row_bytes:
+                            # Torn write of a crashed process
+                            f.truncate(size - size % row_bytes)
+                            size -= size % row_bytes
+                        f.write(vector.tobytes())
+                    row = size // row_bytes
+                    with open(self.keys_path, "ab") as f:
+                        prefix = b""
+                        if f.seek(0, os.SEEK_END) > 0:
+                            with open(self.keys_path, "rb") as existing:
+                                existing.seek(-1, os.SEEK_END)
+                                prefix = b"" if existing.read(1) == b"\n" else b"\n"
+                        f.write(prefix + f"{key}\t{row}\t{self.dim}\n".encode("utf-8"))
+                    self._rows[key] = row
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def __len__(self):
+        return len(self._rows)
+
+
+class _EmbedRequest:
+    def __init__(self, text):
+        self.text = text
+        self.vector = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class CachingEmbeddings(Embeddings):
+    """Embeddings with a query LRU, optional mmap store and request coalescing"""
+
+    def __init__(self, embeddings, max_entries=EMBED_CACHE_MAX_ENTRIES, cache_dir=EMBED_CACHE_DIR,
+                 batching=EMBED_BATCHING, max_batch=EMBED_MAX_BATCH, wait_ms=EMBED_BATCH_WAIT_MS):
+        self.embeddings = embeddings
+        self.model = str(getattr(embeddings, "model", "") or "")
+        self.max_entries = max_entries
+        self.disk = EmbeddingDiskStore(cache_dir) if cache_dir else None
+        self.batching = batching
+        self.max_batch = max_batch
+        self.wait = wait_ms / 1000.0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._worker = None
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.requests = 0
+        self.batches = 0
+
+    def __getattr__(self, name):
+        # Expose attributes of the wrapped client (e.g. .model)
+        if name == "embeddings":
+            raise AttributeError(name)
+        return getattr(self.embeddings, name)
+
+    def embed_documents(self, texts):
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text):
+        key = text_key(text, self.model)
+        with self._lock:
+            vector = self._memory.get(key)
+            if vector is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                # A copy: callers may modify the list they get
+                return list(vector)
+        if self.disk is not None:
+            vector = self.disk.get(key)
+            if vector is not None:
+                with self._lock:
+                    self.disk_hits += 1
+                self._remember(key, list(vector))
+                return vector
+        with self._lock:
+            self.misses += 1
+        vector = self._embed_batched(text) if self.batching else self.embeddings.embed_query(text)
+        self._remember(key, list(vector))
+        if self.disk is not None:
+            self.disk.put(key, vector)
+        return vector
+
+    def _remember(self, key, vector):
+        with self._lock:
+            self._memory[key] = vector
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def _embed_batched(self, text):
+        if self._worker is None:
+            with self._lock:
+                if self._worker is None:
+                    self._worker = threading.Thread(target=self._run, name="embed-batcher", daemon=True)
+                    self._worker.start()
+        request = _EmbedRequest(text)
+        self._queue.put(request)
+        request.done.wait()
+        if request.error is not None:
+            raise request.error
+        return request.vector
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                if len(batch) == 1:
+                    vectors = [self.embeddings.embed_query(batch[0].text)]
+                else:
+                    # Identical concurrent queries are sent once
+                    texts = list(dict.fromkeys(request.text for request in batch))
+                    by_text = dict(zip(texts, self.embeddings.embed_documents(texts)))
+                    vectors = [by_text[request.text] for request in batch]
+                for request, vector in zip(batch, vectors):
+                    request.vector = vector
+            except Exception as e:
+                for request in batch:
+                    request.error = e
+            with self._lock:
+                self.batches += 1
+                self.requests += len(batch)
+            for request in batch:
+                request.done.set()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.disk_hits + self.misses
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_ratio": (self.hits + self.disk_hits) / total if total else 0.0,
+                "entries": len(self._memory),
+                "disk_entries": len(self.disk) if self.disk is not None else None,
+                "queue_depth": self._queue.qsize(),
+                "batches": self.batches,
+                "avg_batch_size": self.requests / self.batches if self.batches else 0.0,
+            }
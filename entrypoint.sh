@@ -15,4 +15,21 @@ ollama pull qwen3:14b
 ollama pull bge-m3
 
 # Run Python app
-python app.py
\ No newline at end of file
+# SERVING_MODE=asgi (default): uvicorn with async /ask, /ask/stream and /ws/asr
+# SERVING_MODE=multi: WEB_WORKERS gunicorn workers sharing one model server
+# SERVING_MODE=flask: Flask development server
+SERVING_MODE=${SERVING_MODE:-asgi}
+if [ "$SERVING_MODE" = "multi" ]; then
+    export MODEL_SERVER_SOCKET=${MODEL_SERVER_SOCKET:-/tmp/chatbot-models.sock}
+    rm -f "$MODEL_SERVER_SOCKET"
+    python model_server.py &
+    echo "Waiting for model server..."
+    while [ ! -S "$MODEL_SERVER_SOCKET" ]; do
+        sleep 2
+    done
+    exec gunicorn -c gunicorn.conf.py asgi_app:application
+elif [ "$SERVING_MODE" = "asgi" ]; then
+    exec uvicorn asgi_app:application --host 0.0.0.0 --port 80
+else
+    python app.py
+fi
\ No newline at end of file
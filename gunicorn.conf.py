@@ -0,0 +1,38 @@
+"""
+gunicorn config for multi-worker serving (SERVING_MODE=multi in entrypoint.sh):
+
+  gunicorn -c gunicorn.conf.py asgi_app:application
+
+The app is imported once in the master and every eager component (FAISS
+indexes, docstores, OpenCC) is loaded before the workers are forked, so the
+workers share those pages copy-on-write. The GPU models are not loaded here:
+with MODEL_SERVER_SOCKET set they are served by model_server.py.
+
+Nothing may talk to Ollama in the master: connections and LLM scheduler
+slots would be inherited by every worker. The qwen3 and question-bank
+warm-ups run per worker from the ASGI startup hook (app.start_warmup).
+"""
+
+import gc
+import os
+
+bind = "0.0.0.0:80"
+workers = int(os.environ.get("WEB_WORKERS", "4"))
+worker_class = "uvicorn.workers.UvicornWorker"
+timeout = int(os.environ.get("WEB_TIMEOUT", "300"))
+preload_app = True
+
+# Unloading a domain in one worker would only drop that worker's reference to
+# the shared pages and reload a private copy later
+os.environ.setdefault("DOMAIN_IDLE_TIMEOUT", "0")
+os.environ.setdefault("MODEL_LOAD_MODE", "eager")
+
+
+def when_ready(server):
+    # Runs in the master after the app is preloaded and before the first fork
+    from shared_models import model_manager
+    ready = model_manager.wait()
+    # Objects allocated so far are never collected, so the collector in a
+    # worker does not touch (and copy) the shared pages
+    gc.freeze()
+    server.log.info(f"Models preloaded (ready={ready}), forking {workers} workers")
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+Hybrid dense + BM25 retrieval over a FAISS vector store.
+
+Dense search alone misses exact medical terms (drug names, lab values,
+「洗腎」). A BM25 inverted index over the same docstore chunks is stored next
+to index.faiss/index.pkl as bm25.json, and the dense and sparse rankings are
+merged with reciprocal-rank fusion. HYBRID_CANDIDATES fused candidates go to
+the cross-encoder, as many as dense retrieval passes by default.
+
+Tokenization (BM25_TOKENIZER):
+  - ngram  CJK character bigrams plus Latin words / numbers (default, no deps)
+  - jieba  jieba.cut_for_search (pip install jieba)
+
+Build or rebuild the index of existing FAISS folders:
+  python hybrid_retrieval.py faiss_index_document_GDM faiss_index_document_ckd ...
+"""
+
+import json
+import math
+import os
+import re
+import sys
+import unicodedata
+from typing import Any, List
+
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+BM25_TOKENIZER = os.environ.get("BM25_TOKENIZER", "ngram")  # ngram | jieba
+BM25_FILE = "bm25.json"
+BM25_FORMAT_VERSION = 1
+BM25_K1 = 1.5
+BM25_B = 0.75
+RRF_K = 60
+
+_CJK = re.compile(r"[\u3400-\u9fff\uf900-\ufaff]")
+_TOKEN = re.compile(r"[\u3400-\u9fff\uf900-\ufaff]+|[a-z0-9]+(?:[.\-/][a-z0-9]+)*")
+
+
+def _ngram_tokens(text):
+    tokens = []
+    for match in _TOKEN.finditer(text):
+        run = match.group()
+        if _CJK.match(run):
+            if len(run) == 1:
+                tokens.append(run)
+            else:
+                tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        else:
+            tokens.append(run)
+    return tokens
+
+
+def _jieba_tokens(text):
+    try:
+        import jieba
+    except ImportError as e:
+        raise RuntimeError("jieba is required for BM25_TOKENIZER=jieba. Install with: pip install jieba") from e
+    return [token for token in jieba.cut_for_search(text) if _TOKEN.fullmatch(token)]
+
+
+def tokenize(text, tokenizer=BM25_TOKENIZER):
+    """NFKC-normalized, lowercased tokens (full-width digits and letters become ASCII)"""
+    text = unicodedata.normalize("NFKC", text or "").lower()
+    if tokenizer == "jieba":
+        return _jieba_tokens(text)
+    return _ngram_tokens(text)
+
+
+class BM25Index:
+    """Okapi BM25 over docstore ids, with postings kept as NumPy arrays"""
+
+    def __init__(self, doc_ids, doc_lengths, postings, tokenizer=BM25_TOKENIZER, k1=BM25_K1, b=BM25_B):
+        self.doc_ids = list(doc_ids)
+        self.doc_lengths = np.asarray(doc_lengths, dtype=np.float32)
+        self.tokenizer = tokenizer
+        self.k1 = k1
+        self.b = b
+        self.postings = {
+            term: (np.asarray(docs, dtype=np.int32), np.asarray(tfs, dtype=np.float32))
+            for term, (docs, tfs) in postings.items()
+        }
+        self.avg_length = float(self.doc_lengths.mean()) if len(self.doc_lengths) else 0.0
+
+    @classmethod
+    def build(cls, documents, tokenizer=BM25_TOKENIZER):
+        """documents: iterable of (docstore id, text)"""
+        doc_ids, doc_lengths, postings = [], [], {}
+        for index, (doc_id, text) in enumerate(documents):
+            tokens = tokenize(text, tokenizer)
+            doc_ids.append(doc_id)
+            doc_lengths.append(len(tokens))
+            counts = {}
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + 1
+            for token, count in counts.items():
+                docs, tfs = postings.setdefault(token, ([], []))
+                docs.append(index)
+                tfs.append(count)
+        return cls(doc_ids, doc_lengths, postings, tokenizer)
+
+    @classmethod
+    def from_vector_store(cls, vector_store, tokenizer=BM25_TOKENIZER):
+        """Index every chunk of a langchain FAISS store, in index order"""
+        documents = []
+        for position in sorted(vector_store.index_to_docstore_id):
+            doc_id = vector_store.index_to_docstore_id[position]
+            documents.append((doc_id, vector_store.docstore.search(doc_id).page_content))
+        return cls.build(documents, tokenizer)
+
+    def save(self, path):
+        data = {
+            "format": BM25_FORMAT_VERSION,
+            "tokenizer": self.tokenizer,
+            "doc_ids": self.doc_ids,
+            "doc_lengths": self.doc_lengths.astype(int).tolist(),
+            "postings": {term: [docs.tolist(), tfs.astype(int).tolist()] for term, (docs, tfs) in self.postings.items()},
+        }
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("format") != BM25_FORMAT_VERSION:
+            raise ValueError(f"Unsupported BM25 index format in {path}")
+        return cls(data["doc_ids"], data["doc_lengths"], data["postings"], data["tokenizer"])
+
+    def search(self, query, k=10):
+        """[(docstore id, score)] of the k best matching chunks"""
+        if not self.doc_ids:
+            return []
+        scores = np.zeros(len(self.doc_ids), dtype=np.float32)
+        count = len(self.doc_ids)
+        for term in set(tokenize(query, self.tokenizer)):
+            posting = self.postings.get(term)
+            if posting is None:
+                continue
+            docs, tfs = posting
+            idf = math.log(1.0 + (count - len(docs) + 0.5) / (len(docs) + 0.5))
+            norm = self.k1 * (1.0 - self.b + self.b * self.doc_lengths[docs] / max(self.avg_length, 1.0))
+            scores[docs] += idf * tfs * (self.k1 + 1.0) / (tfs + norm)
+        top = np.argsort(-scores)[:k]
+        return [(self.doc_ids[i], float(scores[i])) for i in top if scores[i] > 0]
+
+
+def load_bm25(vector_store, faiss_path, tokenizer=BM25_TOKENIZER):
+    """bm25.json of a FAISS folder, (re)built and saved when missing or stale"""
+    path = os.path.join(faiss_path, BM25_FILE)
+    expected = set(vector_store.index_to_docstore_id.values())
+    try:
+        index = BM25Index.load(path)
+        if set(index.doc_ids) == expected and index.tokenizer == tokenizer:
+            return index
+        print(f"⚠️  {path} does not match the FAISS docstore, rebuilding")
+    except FileNotFoundError:
+        print(f"🔄 No {BM25_FILE} in {faiss_path}, building it")
+    except (OSError, ValueError, KeyError) as e:
+        print(f"⚠️  Cannot read {path} ({e}), rebuilding")
+    index = BM25Index.from_vector_store(vector_store, tokenizer)
+    try:
+        index.save(path)
+    except OSError as e:
+        print(f"⚠️  Cannot save {path}: {e}")
+    return index
+
+
+def reciprocal_rank_fusion(rankings, k=RRF_K):
+    """Fuse ranked lists of keys; returns keys by descending sum of 1 / (k + rank)"""
+    scores = {}
+    for ranking in rankings:
+        for rank, key in enumerate(ranking, 1):
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+    return sorted(scores, key=scores.get, reverse=True)
+
+
+class HybridRetriever(BaseRetriever):
+    """Dense FAISS search and BM25 fused with reciprocal-rank fusion"""
+
+    vector_store: Any
+    bm25: Any
+    dense_k: int = 10
+    sparse_k: int = 10
+    k: int = 8
+    rrf_k: int = RRF_K
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        store = self.vector_store
+        # Search the FAISS index directly to get docstore ids for the fusion
+        vector = np.array([store.embeddings.embed_query(query)], dtype=np.float32)
+        if getattr(store, "_normalize_L2", False):
+            vector /= max(float(np.linalg.norm(vector)), 1e-12)
+        _, indices = store.index.search(vector, self.dense_k)
+        dense = [store.index_to_docstore_id[i] for i in indices[0] if i != -1]
+        sparse = [doc_id for doc_id, _ in self.bm25.search(query, self.sparse_k)]
+        fused = reciprocal_rank_fusion([dense, sparse], self.rrf_k)[:self.k]
+        documents = []
+        for doc_id in fused:
+            document = store.docstore.search(doc_id)
+            if isinstance(document, Document):
+                documents.append(document)
+        return documents
+
+
+def main(argv):
+    import argparse
+    from index_store import read_docstore, resolve_index_dir
+
+    parser = argparse.ArgumentParser(description="Build bm25.json next to FAISS indexes")
+    parser.add_argument("faiss_paths", nargs="+")
+    parser.add_argument("--tokenizer", default=BM25_TOKENIZER, choices=["ngram", "jieba"])
+    args = parser.parse_args(argv[1:])
+
+    for faiss_path in args.faiss_paths:
+        faiss_path = resolve_index_dir(faiss_path)
+        docstore, index_to_docstore_id = read_docstore(faiss_path)
+        documents = [(doc_id, docstore.search(doc_id).page_content)
+                     for _, doc_id in sorted(index_to_docstore_id.items())]
+        index = BM25Index.build(documents, args.tokenizer)
+        index.save(os.path.join(faiss_path, BM25_FILE))
+        print(f"✅ {faiss_path}: {len(index.doc_ids)} chunks, {len(index.postings)} terms ({args.tokenizer})")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main(sys.argv))
@@ -0,0 +1,141 @@
+"""
+On-disk format of the domain indexes written by ingest.py.
+
+  <index dir>/index.faiss      FAISS index, memory-mapped read-only at startup
+  <index dir>/docstore.sqlite  chunks (id, position, source, content hash, text, metadata)
+  <index dir>/bm25.json        sparse index for hybrid retrieval
+  <index dir>/manifest.json    version, embedding model, chunking parameters, counts
+
+`ingest.py build` writes every version to its own subdirectory (v1, v2, ...)
+and then points <index dir>/CURRENT at it; resolve_index_dir() follows the
+pointer. Files of a version are never rewritten, so a running server keeps
+reading a consistent index.faiss + docstore.sqlite pair until it reloads.
+
+Nothing is unpickled: SQLiteDocstore reads chunks on demand, so a worker does
+not hold the whole corpus in memory. Old directories with index.pkl (the
+langchain FAISS.save_local format) are still readable, and
+`python ingest.py migrate <dir>` converts them without re-embedding.
+"""
+
+import json
+import os
+import pickle
+import sqlite3
+import threading
+
+from langchain_community.docstore.base import Docstore
+from langchain_core.documents import Document
+
+DOCSTORE_FILE = "docstore.sqlite"
+MANIFEST_FILE = "manifest.json"
+CURRENT_FILE = "CURRENT"
+INDEX_FORMAT_VERSION = 1
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS chunks (
+    id TEXT PRIMARY KEY,
+    position INTEGER NOT NULL UNIQUE,
+    source TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    content TEXT NOT NULL,
+    metadata TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS chunks_content_hash ON chunks (content_hash);
+"""
+
+
+class SQLiteDocstore(Docstore):
+    """Read-only langchain docstore backed by docstore.sqlite"""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+    def _connection(self):
+        # One connection per thread and per process (connections do not survive fork)
+        if getattr(self._local, "pid", None) != os.getpid():
+            self._local.connection = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True,
+                                                     check_same_thread=False)
+            self._local.pid = os.getpid()
+        return self._local.connection
+
+    def search(self, search):
+        row = self._connection().execute(
+            "SELECT content, metadata FROM chunks WHERE id = ?", (search,)).fetchone()
+        if row is None:
+            return f"ID {search} not found."
+        return Document(id=search, page_content=row[0], metadata=json.loads(row[1]))
+
+    def add(self, texts):
+        raise NotImplementedError("SQLiteDocstore is read-only, rebuild the index with ingest.py")
+
+    def delete(self, ids):
+        raise NotImplementedError("SQLiteDocstore is read-only, rebuild the index with ingest.py")
+
+    def index_to_docstore_id(self):
+        rows = self._connection().execute("SELECT position, id FROM chunks ORDER BY position")
+        return {position: doc_id for position, doc_id in rows}
+
+    def chunks(self):
+        """(id, position, source, content_hash, content, metadata) in index order"""
+        rows = self._connection().execute(
+            "SELECT id, position, source, content_hash, content, metadata FROM chunks ORDER BY position")
+        return [(doc_id, position, source, content_hash, content, json.loads(metadata))
+                for doc_id, position, source, content_hash, content, metadata in rows]
+
+
+def write_docstore(path, chunks):
+    """chunks: iterable of (id, source, content_hash, content, metadata) in index order"""
+    if os.path.exists(path):
+        os.remove(path)
+    connection = sqlite3.connect(path)
+    try:
+        connection.executescript(_SCHEMA)
+        connection.executemany(
+            "INSERT INTO chunks (id, position, source, content_hash, content, metadata) VALUES (?, ?, ?, ?, ?, ?)",
+            [(doc_id, position, source, content_hash, content, json.dumps(metadata, ensure_ascii=False))
+             for position, (doc_id, source, content_hash, content, metadata) in enumerate(chunks)],
+        )
+        connection.commit()
+    finally:
+        connection.close()
+
+
+def resolve_index_dir(index_dir):
+    """Directory of the current version: <index_dir>/<CURRENT> when built by ingest.py, else index_dir"""
+    try:
+        with open(os.path.join(index_dir, CURRENT_FILE), "r", encoding="utf-8") as f:
+            version = f.read().strip()
+    except FileNotFoundError:
+        return index_dir
+    return os.path.join(index_dir, version) if version else index_dir
+
+
+def write_current(index_dir, version):
+    tmp_path = os.path.join(index_dir, CURRENT_FILE + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(version + "\n")
+    os.replace(tmp_path, os.path.join(index_dir, CURRENT_FILE))
+
+
+def read_manifest(index_dir):
+    try:
+        with open(os.path.join(index_dir, MANIFEST_FILE), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def write_manifest(index_dir, manifest):
+    with open(os.path.join(index_dir, MANIFEST_FILE), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+
+def read_docstore(index_dir, index_name="index"):
+    """(docstore, index_to_docstore_id): SQLite when present, else the legacy index.pkl"""
+    sqlite_path = os.path.join(index_dir, DOCSTORE_FILE)
+    if os.path.exists(sqlite_path):
+        docstore = SQLiteDocstore(sqlite_path)
+        return docstore, docstore.index_to_docstore_id()
+    with open(os.path.join(index_dir, f"{index_name}.pkl"), "rb") as f:
+        return pickle.load(f)
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""Build and update the domain indexes (FAISS + SQLite docstore + BM25).
+
+Usage:
+  python ingest.py build SOURCE_DIR OUTPUT_DIR [--chunk-size 500] [--chunk-overlap 80] [--batch-size 32] [--full]
+  python ingest.py migrate faiss_index_document_GDM [faiss_index_document_ckd ...]
+
+build:
+  - Reads every .txt/.md (and .pdf with pypdf installed) file under SOURCE_DIR
+    and splits it into chunks on paragraph and sentence boundaries.
+  - Each chunk is identified by the SHA-256 of its text. When OUTPUT_DIR already
+    holds an index, vectors of unchanged chunks are copied from it and only
+    new or changed chunks are embedded (in batches, bge-m3 through Ollama).
+    --full re-embeds everything.
+  - Writes index.faiss, docstore.sqlite, bm25.json and manifest.json (see
+    index_store.py) to a new version directory OUTPUT_DIR/v<N> and then
+    points OUTPUT_DIR/CURRENT at it. A running server keeps reading the
+    previous version, which is kept, until it reloads; older versions are
+    removed.
+
+migrate:
+  - Converts a langchain FAISS.save_local directory (index.faiss + index.pkl)
+    to the same format in place without re-embedding; index.pkl is kept.
+"""
+import argparse
+import hashlib
+import os
+import re
+import shutil
+import sys
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from index_store import (DOCSTORE_FILE, INDEX_FORMAT_VERSION, read_docstore, read_manifest,
+                         resolve_index_dir, write_current, write_docstore, write_manifest)
+from hybrid_retrieval import BM25Index, BM25_FILE, BM25_TOKENIZER
+
+EMBEDDING_MODEL = "bge-m3"
+SOURCE_EXTENSIONS = {".txt", ".md", ".pdf"}
+# Paragraphs first, then Chinese and Latin sentence ends
+SEPARATORS = ["\n\n", "\n", "。", "！", "？", "；", "!", "?", ";", " ", ""]
+
+
+def content_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def read_source(path):
+    if path.lower().endswith(".pdf"):
+        try:
+            from pypdf import PdfReader
+        except ImportError as e:
+            raise RuntimeError("pypdf is required to ingest PDF files. Install with: pip install pypdf") from e
+        return "\n\n".join(page.extract_text() or "" for page in PdfReader(path).pages)
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def load_chunks(source_dir, chunk_size, chunk_overlap):
+    """[(id, source, content_hash, content, metadata)] of every source file, in a stable order"""
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap,
+                                              separators=SEPARATORS, keep_separator="end")
+    chunks, seen = [], set()
+    for root, _, files in sorted(os.walk(source_dir)):
+        for name in sorted(files):
+            if os.path.splitext(name)[1].lower() not in SOURCE_EXTENSIONS:
+                continue
+            path = os.path.join(root, name)
+            source = os.path.relpath(path, source_dir)
+            for number, text in enumerate(splitter.split_text(read_source(path))):
+                text = text.strip()
+                digest = content_hash(text)
+                if not text or (source, digest) in seen:
+                    continue
+                seen.add((source, digest))
+                doc_id = hashlib.sha256(f"{source}\0{digest}".encode("utf-8")).hexdigest()[:32]
+                chunks.append((doc_id, source, digest, text, {"source": source, "chunk": number}))
+    return chunks
+
+
+def previous_vectors(index_dir):
+    """content_hash -> vector of an existing index in the new format, empty when there is none"""
+    import faiss
+
+    if not os.path.exists(os.path.join(index_dir, DOCSTORE_FILE)):
+        return {}
+    docstore, _ = read_docstore(index_dir)
+    index = faiss.read_index(os.path.join(index_dir, "index.faiss"))
+    return {digest: index.reconstruct(position) for _, position, _, digest, _, _ in docstore.chunks()}
+
+
+def embed_batches(embeddings, texts, batch_size):
+    vectors = []
+    for start in range(0, len(texts), batch_size):
+        batch = texts[start:start + batch_size]
+        start_time = time.time()
+        vectors.extend(embeddings.embed_documents(batch))
+        print(f"   embedded {start + len(batch)}/{len(texts)} ({time.time() - start_time:.1f}s)")
+    return vectors
+
+
+def write_index(index_dir, chunks, vectors, manifest):
+    """Write every file of the index format into index_dir"""
+    import faiss
+
+    matrix = np.asarray(vectors, dtype=np.float32)
+    # Same index type FAISS.from_documents uses (euclidean distance)
+    index = faiss.IndexFlatL2(matrix.shape[1])
+    index.add(matrix)
+    faiss.write_index(index, os.path.join(index_dir, "index.faiss"))
+    write_docstore(os.path.join(index_dir, DOCSTORE_FILE), chunks)
+    BM25Index.build([(chunk[0], chunk[3]) for chunk in chunks], BM25_TOKENIZER).save(
+        os.path.join(index_dir, BM25_FILE))
+    manifest["dimension"] = int(matrix.shape[1])
+    manifest["chunks"] = len(chunks)
+    manifest["digest"] = hashlib.sha256("".join(chunk[2] for chunk in chunks).encode("utf-8")).hexdigest()[:16]
+    write_manifest(index_dir, manifest)
+
+
+def build(source_dir, output_dir, chunk_size, chunk_overlap, batch_size, model, full):
+    from langchain_ollama import OllamaEmbeddings
+
+    chunks = load_chunks(source_dir, chunk_size, chunk_overlap)
+    if not chunks:
+        print(f"No source documents found in {source_dir}")
+        return 2
+    previous_dir = resolve_index_dir(output_dir)
+    previous = read_manifest(previous_dir) or {}
+    reusable = {}
+    if not full and previous.get("embedding_model") == model:
+        reusable = previous_vectors(previous_dir)
+
+    todo = sorted({digest: text for _, _, digest, text, _ in chunks if digest not in reusable}.items())
+    print(f"{len(chunks)} chunks, {len(chunks) - len(todo)} unchanged, {len(todo)} to embed")
+    embedded = dict(zip([digest for digest, _ in todo],
+                        embed_batches(OllamaEmbeddings(model=model), [text for _, text in todo], batch_size)))
+    vectors = [embedded[digest] if digest in embedded else reusable[digest] for _, _, digest, _, _ in chunks]
+
+    manifest = {
+        "format": INDEX_FORMAT_VERSION,
+        "version": previous.get("version", 0) + 1,
+        "built_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "embedding_model": model,
+        "chunk_size": chunk_size,
+        "chunk_overlap": chunk_overlap,
+        "bm25_tokenizer": BM25_TOKENIZER,
+        "embedded": len(todo),
+        "reused": len(chunks) - len(todo),
+    }
+    version_name = f"v{manifest['version']}"
+    version_dir = os.path.join(output_dir, version_name)
+    tmp_dir = version_dir + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    write_index(tmp_dir, chunks, vectors, manifest)
+    shutil.rmtree(version_dir, ignore_errors=True)
+    os.rename(tmp_dir, version_dir)
+
+    # Switch the pointer; servers still on the previous version keep its files
+    write_current(output_dir, version_name)
+    keep = {version_name, os.path.basename(os.path.normpath(previous_dir))}
+    for entry in os.listdir(output_dir):
+        if re.fullmatch(r"v\d+", entry) and entry not in keep:
+            shutil.rmtree(os.path.join(output_dir, entry), ignore_errors=True)
+    print(f"✅ {output_dir}: version {manifest['version']} in {version_dir}, {manifest['chunks']} chunks")
+    return 0
+
+
+def migrate(index_dir):
+    """index.faiss + index.pkl -> docstore.sqlite, bm25.json, manifest.json (no re-embedding)"""
+    import faiss
+
+    index_dir = resolve_index_dir(index_dir)
+    docstore, index_to_docstore_id = read_docstore(index_dir)
+    chunks = []
+    for position in sorted(index_to_docstore_id):
+        doc_id = index_to_docstore_id[position]
+        document = docstore.search(doc_id)
+        metadata = dict(document.metadata)
+        chunks.append((doc_id, str(metadata.get("source", "")), content_hash(document.page_content),
+                       document.page_content, metadata))
+    index = faiss.read_index(os.path.join(index_dir, "index.faiss"))
+    write_docstore(os.path.join(index_dir, DOCSTORE_FILE), chunks)
+    BM25Index.build([(chunk[0], chunk[3]) for chunk in chunks], BM25_TOKENIZER).save(
+        os.path.join(index_dir, BM25_FILE))
+    write_manifest(index_dir, {
+        "format": INDEX_FORMAT_VERSION,
+        "version": 1,
+        "built_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "embedding_model": EMBEDDING_MODEL,
+        "bm25_tokenizer": BM25_TOKENIZER,
+        "dimension": index.d,
+        "chunks": len(chunks),
+        "digest": hashlib.sha256("".join(chunk[2] for chunk in chunks).encode("utf-8")).hexdigest()[:16],
+        "migrated_from": "index.pkl",
+    })
+    print(f"✅ {index_dir}: {len(chunks)} chunks migrated")
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Build and update the domain indexes")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build_parser = subparsers.add_parser("build", help="chunk, embed and write an index")
+    build_parser.add_argument("source_dir")
+    build_parser.add_argument("output_dir")
+    build_parser.add_argument("--chunk-size", type=int, default=500)
+    build_parser.add_argument("--chunk-overlap", type=int, default=80)
+    build_parser.add_argument("--batch-size", type=int, default=32)
+    build_parser.add_argument("--model", default=EMBEDDING_MODEL)
+    build_parser.add_argument("--full", action="store_true", help="re-embed every chunk")
+
+    migrate_parser = subparsers.add_parser("migrate", help="convert index.pkl directories without re-embedding")
+    migrate_parser.add_argument("index_dirs", nargs="+")
+
+    args = parser.parse_args(argv[1:])
+    if args.command == "build":
+        return build(args.source_dir, args.output_dir, args.chunk_size, args.chunk_overlap,
+                     args.batch_size, args.model, args.full)
+    for index_dir in args.index_dirs:
+        migrate(index_dir)
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main(sys.argv))
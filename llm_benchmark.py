@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""Benchmark first-token latency of the qwen3 prompt layouts.
+
+Usage:
+  python llm_benchmark.py [--domain gdm] [--questions 5] [--runs 2] [--max-tokens 32] [--cold]
+
+Behavior:
+  - The first --questions questions of the domain's question bank are
+    retrieved and reranked once; every layout gets the same contexts.
+  - legacy  question first, guidelines after the context, one user message,
+            Ollama default keep_alive and num_ctx (the old templates)
+  - system  guidelines as the system message, then context and question in
+            the user message, with CHAT_KEEP_ALIVE / CHAT_NUM_CTX pinned
+  - The first request of each layout is reported separately (it pays for a
+    model (re)load, with --cold qwen3 is unloaded before it), the others give
+    the steady-state first-token latency.
+  - Prompt tokens evaluated and prefill time are taken from Ollama's reply:
+    a reused prefix shows up as fewer evaluated tokens.
+"""
+import argparse
+import statistics
+import sys
+import time
+
+LEGACY_TEMPLATE = """
+##問題(Question):"{question}"
+
+##檢索上下文(Retrieved Context):{context}
+{system}
+根據以上資訊，請回答：{question}
+"""
+
+
+def legacy_messages(config, context, question):
+    from langchain_core.messages import HumanMessage
+    text = LEGACY_TEMPLATE.format(question=question, context=context, system=config["system_prompt"])
+    return [HumanMessage(text)]
+
+
+def system_messages(config, context, question):
+    from langchain_core.messages import HumanMessage, SystemMessage
+    return [SystemMessage(config["system_prompt"]),
+            HumanMessage(config["prompt_template"].format(context=context, question=question))]
+
+
+def unload(model):
+    """keep_alive=0 makes Ollama unload the model right after this request"""
+    model.model_copy(update={"keep_alive": 0, "num_predict": 1}).invoke("你好")
+
+
+def timed_stream(model, messages):
+    """(first token seconds, prompt tokens evaluated, prefill seconds)"""
+    start_time = time.time()
+    first_token = None
+    info = {}
+    for chunk in model.stream(messages):
+        if first_token is None and chunk.content:
+            first_token = time.time() - start_time
+        if "prompt_eval_count" in chunk.response_metadata:
+            info = chunk.response_metadata
+    prefill = (info.get("prompt_eval_duration") or 0) / 1e9
+    return first_token or time.time() - start_time, int(info.get("prompt_eval_count") or 0), prefill
+
+
+def benchmark(name, model, build_messages, config, contexts, runs, cold):
+    if cold:
+        unload(model)
+    first = None
+    latencies, tokens, prefills = [], [], []
+    for _ in range(runs):
+        for question, context in contexts:
+            latency, prompt_tokens, prefill = timed_stream(model, build_messages(config, context, question))
+            print(f"[{name}] {latency:.2f}s first token, {prompt_tokens} prompt tokens, "
+                  f"prefill {prefill:.2f}s: {question[:30]}")
+            if first is None:
+                first = latency
+                continue
+            latencies.append(latency)
+            tokens.append(prompt_tokens)
+            prefills.append(prefill)
+    return {
+        "layout": name,
+        "first": first,
+        "p50": statistics.median(latencies) if latencies else float("nan"),
+        "mean": statistics.mean(latencies) if latencies else float("nan"),
+        "tokens": statistics.mean(tokens) if tokens else float("nan"),
+        "prefill": statistics.mean(prefills) if prefills else float("nan"),
+    }
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Benchmark first-token latency of the prompt layouts")
+    parser.add_argument("--domain", default="gdm")
+    parser.add_argument("--questions", type=int, default=5)
+    parser.add_argument("--runs", type=int, default=2, help="passes over the questions per layout")
+    parser.add_argument("--max-tokens", type=int, default=32, help="num_predict of the timed requests")
+    parser.add_argument("--cold", action="store_true", help="unload qwen3 before each layout")
+    args = parser.parse_args(argv[1:])
+
+    from langchain_ollama import ChatOllama
+    from shared_models import model_manager, shared_chat_model
+    from domains import DomainRegistry
+    from context_assembly import ContextAssembler
+
+    registry = DomainRegistry(model_manager)
+    config = registry.config(args.domain)
+    if not config.get("system_prompt"):
+        print(f"Domain {args.domain} has no system_prompt to compare")
+        return 2
+    with open(config["question_file"], "r", encoding="utf-8") as f:
+        questions = [line.strip() for line in f if line.strip()][:args.questions]
+    if not questions:
+        print(f"No questions in {config['question_file']}")
+        return 2
+
+    retriever = registry.get(args.domain)["compression_retriever"]
+    assembler = ContextAssembler(label=config["label"])
+    contexts = [(question, assembler.format(retriever.invoke(question))) for question in questions]
+
+    # The old client: same sampling, Ollama defaults for keep_alive and num_ctx
+    legacy_model = ChatOllama(model=shared_chat_model.model, temperature=shared_chat_model.temperature,
+                              top_k=shared_chat_model.top_k, top_p=shared_chat_model.top_p,
+                              repeat_penalty=shared_chat_model.repeat_penalty, num_predict=args.max_tokens)
+    system_model = shared_chat_model.model_copy(update={"num_predict": args.max_tokens})
+
+    results = [
+        benchmark("legacy", legacy_model, legacy_messages, config, contexts, args.runs, args.cold),
+        benchmark("system", system_model, system_messages, config, contexts, args.runs, args.cold),
+    ]
+
+    print(f"\n{'layout':<8} {'first s':>8} {'p50 s':>8} {'mean s':>8} {'tokens':>8} {'prefill s':>10}")
+    for result in results:
+        print(f"{result['layout']:<8} {result['first']:>8.2f} {result['p50']:>8.2f} {result['mean']:>8.2f} "
+              f"{result['tokens']:>8.0f} {result['prefill']:>10.2f}")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main(sys.argv))
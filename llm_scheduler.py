@@ -0,0 +1,276 @@
+"""
+Admission control and priority scheduling in front of the Ollama chat model.
+
+At most LLM_CONCURRENCY generations run at once (set it to Ollama's
+OLLAMA_NUM_PARALLEL); further requests wait in a bounded priority queue:
+interactive chat first, then related-question generation, then batch jobs.
+A request is rejected up front with LLMOverloaded when the queue is full or
+when its estimated wait already exceeds LLM_QUEUE_TIMEOUT, and a waiting
+request gives up when the deadline passes. Batch jobs are never rejected and
+do not count toward LLM_QUEUE_MAX, so a pregenerate_answers.py run cannot fill
+the queue for chat requests.
+
+Priority only orders waiting requests, a running generation is never
+preempted. Related-question generation therefore never queues and never takes
+the last LLM_INTERACTIVE_RESERVED slots: it runs only on spare capacity and is
+rejected otherwise (/related then answers from the question bank). With
+LLM_CONCURRENCY=1 it never reaches the LLM.
+
+The priority of the current request is a context variable, so callers only
+wrap their work in `with llm_priority(BATCH):`; the slot itself is taken by
+the chat model (see shared_models.ScheduledChatOllama), i.e. only while Ollama
+is generating and not during retrieval and reranking.
+
+The limit is per process: with SERVING_MODE=multi set LLM_CONCURRENCY to
+OLLAMA_NUM_PARALLEL / WEB_WORKERS.
+"""
+
+import asyncio
+import contextlib
+import contextvars
+import heapq
+import itertools
+import math
+import os
+import threading
+import time
+
+LLM_CONCURRENCY = int(os.environ.get("LLM_CONCURRENCY", os.environ.get("OLLAMA_NUM_PARALLEL", "4")))
+LLM_QUEUE_MAX = int(os.environ.get("LLM_QUEUE_MAX", "32"))
+LLM_QUEUE_TIMEOUT = float(os.environ.get("LLM_QUEUE_TIMEOUT", "30"))  # seconds, 0 disables deadlines
+LLM_SERVICE_TIME = float(os.environ.get("LLM_SERVICE_TIME", "10"))  # initial estimate per request
+# Slots only interactive (and batch) requests may take
+LLM_INTERACTIVE_RESERVED = int(os.environ.get("LLM_INTERACTIVE_RESERVED", "1"))
+
+INTERACTIVE = 0
+RELATED = 1
+BATCH = 2
+PRIORITY_NAMES = {INTERACTIVE: "interactive", RELATED: "related", BATCH: "batch"}
+
+_priority = contextvars.ContextVar("llm_priority", default=INTERACTIVE)
+
+
+@contextlib.contextmanager
+def llm_priority(priority):
+    """Run LLM calls made inside the block with the given priority class"""
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class LLMOverloaded(Exception):
+    """Raised when a request cannot get an LLM slot before its deadline"""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class _Waiter:
+    def __init__(self, priority, loop=None):
+        self.priority = priority
+        self.enqueued = time.time()
+        self.granted = False
+        self.abandoned = False
+        self.event = threading.Event()
+        self.loop = loop
+        self.future = loop.create_future() if loop is not None else None
+
+    def wake(self):
+        self.granted = True
+        if self.future is not None:
+            self.loop.call_soon_threadsafe(_resolve, self.future)
+        else:
+            self.event.set()
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class LLMScheduler:
+    """Concurrency limit plus a priority queue with deadline-aware admission"""
+
+    def __init__(self, concurrency=LLM_CONCURRENCY, max_queue=LLM_QUEUE_MAX,
+                 timeout=LLM_QUEUE_TIMEOUT, service_time=LLM_SERVICE_TIME, reserved=LLM_INTERACTIVE_RESERVED):
+        self.concurrency = max(1, concurrency)
+        self.reserved = max(0, reserved)
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._service_time = service_time  # moving average of slot hold time
+        self._lock = threading.Lock()
+        self._active = 0
+        self._queue = []  # heap of (priority, seq, waiter)
+        self._seq = itertools.count()
+        self._completed = 0
+        self._rejected = 0
+        self._timed_out = 0
+        self._queue_wait_total = 0.0
+        self._queue_wait_max = 0.0
+
+    def _waiting(self):
+        return [entry[2] for entry in self._queue if not entry[2].abandoned]
+
+    def _position(self, priority):
+        """1-based queue position a new request of this priority would get"""
+        return sum(1 for waiter in self._waiting() if waiter.priority <= priority) + 1
+
+    def _eta(self, position):
+        # Every `concurrency` requests ahead cost one average generation
+        return math.ceil(position / self.concurrency) * self._service_time
+
+    def estimate(self, priority=None):
+        """{"position", "eta"} for a request of this priority arriving now; position 0 = no wait"""
+        priority = _priority.get() if priority is None else priority
+        with self._lock:
+            if self._active < self.concurrency and not self._waiting():
+                return {"position": 0, "eta": 0.0}
+            position = self._position(priority)
+            return {"position": position, "eta": round(self._eta(position), 1)}
+
+    def _check_spare(self, priority):
+        """Related generation only runs on a free, unreserved slot and never waits"""
+        if priority != RELATED:
+            return
+        if self._active + self.reserved >= self.concurrency or self._waiting():
+            self._rejected += 1
+            raise LLMOverloaded("No spare LLM slot, the reserved ones are for chat answers", self._service_time)
+
+    def check(self, priority=None):
+        """Reject early, before any retrieval work, when the request would not make its deadline"""
+        priority = _priority.get() if priority is None else priority
+        with self._lock:
+            self._check_spare(priority)
+            if self._active < self.concurrency and not self._waiting():
+                return
+            self._admit(priority)
+
+    def _admit(self, priority):
+        if priority == BATCH:
+            return
+        # Queued batch jobs run after everything else, they do not hold up admission
+        waiting = sum(1 for waiter in self._waiting() if waiter.priority != BATCH)
+        if waiting >= self.max_queue:
+            self._rejected += 1
+            raise LLMOverloaded(f"LLM queue is full ({waiting} requests)", self._eta(waiting))
+        eta = self._eta(self._position(priority))
+        if self.timeout and eta > self.timeout:
+            self._rejected += 1
+            raise LLMOverloaded(f"Estimated LLM wait {eta:.0f}s exceeds {self.timeout:.0f}s", eta)
+
+    def _enqueue(self, priority, loop=None):
+        """None when a slot was taken right away, otherwise the queued waiter"""
+        with self._lock:
+            self._check_spare(priority)
+            if self._active < self.concurrency and not self._waiting():
+                self._active += 1
+                self._record_wait(0.0)
+                return None
+            self._admit(priority)
+            waiter = _Waiter(priority, loop)
+            heapq.heappush(self._queue, (priority, next(self._seq), waiter))
+            return waiter
+
+    def _deadline(self, waiter):
+        if waiter.priority == BATCH or not self.timeout:
+            return None
+        return max(0.0, waiter.enqueued + self.timeout - time.time())
+
+    def _record_wait(self, wait):
+        self._queue_wait_total += wait
+        self._queue_wait_max = max(self._queue_wait_max, wait)
+
+    def _abandon(self, waiter):
+        """Give up waiting; returns True if the slot was granted in the meantime"""
+        with self._lock:
+            if waiter.granted:
+                return True
+            waiter.abandoned = True
+            self._timed_out += 1
+            return False
+
+    def _release(self, held=None):
+        with self._lock:
+            if held is not None:
+                self._completed += 1
+                self._service_time = 0.8 * self._service_time + 0.2 * held
+            while self._queue:
+                _, _, waiter = heapq.heappop(self._queue)
+                if waiter.abandoned:
+                    continue
+                # Hand the slot over directly, _active stays the same
+                self._record_wait(time.time() - waiter.enqueued)
+                waiter.wake()
+                return
+            self._active -= 1
+
+    def _overloaded(self):
+        return LLMOverloaded(f"No LLM slot within {self.timeout:.0f}s", self._service_time)
+
+    @contextlib.contextmanager
+    def slot(self, priority=None):
+        """Hold one LLM slot for the duration of the block"""
+        priority = _priority.get() if priority is None else priority
+        waiter = self._enqueue(priority)
+        if waiter is not None and not waiter.event.wait(self._deadline(waiter)):
+            if not self._abandon(waiter):
+                raise self._overloaded()
+        start = time.time()
+        try:
+            yield
+        finally:
+            self._release(time.time() - start)
+
+    @contextlib.asynccontextmanager
+    async def aslot(self, priority=None):
+        """Async version of slot(), waits on the event loop instead of a thread"""
+        priority = _priority.get() if priority is None else priority
+        waiter = self._enqueue(priority, asyncio.get_running_loop())
+        if waiter is not None:
+            try:
+                await asyncio.wait_for(asyncio.shield(waiter.future), self._deadline(waiter))
+            except asyncio.TimeoutError:
+                if not self._abandon(waiter):
+                    raise self._overloaded()
+            except asyncio.CancelledError:
+                # Client went away while queued
+                if self._abandon(waiter):
+                    self._release()
+                raise
+        start = time.time()
+        try:
+            yield
+        finally:
+            self._release(time.time() - start)
+
+    def stats(self):
+        with self._lock:
+            waiting = self._waiting()
+            completed = self._completed
+            return {
+                "concurrency": self.concurrency,
+                "reserved": self.reserved,
+                "active": self._active,
+                "queue_depth": len(waiting),
+                "max_queue": self.max_queue,
+                "queued_by_priority": {
+                    name: sum(1 for waiter in waiting if waiter.priority == priority)
+                    for priority, name in PRIORITY_NAMES.items()
+                },
+                "estimated_wait": {
+                    name: round(self._eta(self._position(priority)), 1) if waiting or self._active >= self.concurrency else 0.0
+                    for priority, name in PRIORITY_NAMES.items()
+                },
+                "avg_service_time": round(self._service_time, 3),
+                "completed": completed,
+                "rejected": self._rejected,
+                "timed_out": self._timed_out,
+                "avg_queue_wait": self._queue_wait_total / completed if completed else 0.0,
+                "max_queue_wait": self._queue_wait_max,
+            }
+
+
+llm_scheduler = LLMScheduler()
@@ -0,0 +1,146 @@
+"""
+Initialization manager for the heavy models (ASR, reranker, FAISS indexes, OpenCC).
+
+Each component is registered with a loader function and is either loaded
+eagerly in a background thread at startup or lazily on first use, selected by
+MODEL_LOAD_MODE (or MODEL_LOAD_MODE_<NAME> for a single component). Load state
+and load time of every component are reported for the /ready endpoint.
+"""
+
+import os
+import threading
+import time
+
+MODEL_LOAD_MODE = os.environ.get("MODEL_LOAD_MODE", "eager")  # eager | lazy
+
+PENDING = "pending"
+LOADING = "loading"
+READY = "ready"
+FAILED = "failed"
+UNLOADED = "unloaded"
+
+
+class _Component:
+    def __init__(self, name, loader, mode):
+        self.name = name
+        self.loader = loader
+        self.mode = mode
+        self.state = PENDING
+        self.value = None
+        self.error = None
+        self.load_time = None
+        self.lock = threading.Lock()
+
+
+class ModelManager:
+    """Registry of lazily or concurrently loaded components"""
+
+    def __init__(self, default_mode=MODEL_LOAD_MODE):
+        self.default_mode = default_mode
+        self._components = {}
+        self._threads = []
+
+    def register(self, name, loader, mode=None):
+        env_mode = os.environ.get(f"MODEL_LOAD_MODE_{name.upper()}")
+        self._components[name] = _Component(name, loader, mode or env_mode or self.default_mode)
+
+    def unregister(self, name):
+        self._components.pop(name, None)
+
+    def __contains__(self, name):
+        return name in self._components
+
+    def get(self, name):
+        """Return the loaded component, loading it (or waiting for it) if needed"""
+        component = self._components[name]
+        # Lock-free fast path: unload() marks the component UNLOADED before it
+        # clears value, so a value read before a READY state is never None
+        value = component.value
+        if component.state == READY and value is not None:
+            return value
+        with component.lock:
+            if component.state != READY:
+                self._load(component)
+            return component.value
+
+    def is_loaded(self, name):
+        component = self._components.get(name)
+        return component is not None and component.state == READY
+
+    def unload(self, name):
+        """Drop a loaded component; it is loaded again on next get()"""
+        component = self._components[name]
+        with component.lock:
+            component.state = UNLOADED
+            component.value = None
+            component.load_time = None
+
+    def _load(self, component):
+        component.state = LOADING
+        component.error = None
+        start_time = time.time()
+        print(f"🔄 Loading component: {component.name}...")
+        try:
+            component.value = component.loader()
+        except Exception as e:
+            component.state = FAILED
+            component.error = str(e)
+            print(f"❌ Failed to load {component.name}: {e}")
+            raise
+        component.load_time = time.time() - start_time
+        component.state = READY
+        print(f"✅ Loaded {component.name}: {component.load_time:.2f}s")
+
+    def _background_load(self, name):
+        try:
+            self.get(name)
+        except Exception:
+            pass  # already logged, state is FAILED
+
+    def start(self):
+        """Load every eager component concurrently in background threads"""
+        threads = []
+        for name, component in self._components.items():
+            if component.mode == "eager" and component.state == PENDING:
+                thread = threading.Thread(target=self._background_load, args=(name,),
+                                          name=f"load-{name}", daemon=True)
+                thread.start()
+                threads.append(thread)
+        self._threads.extend(threads)
+        return threads
+
+    def wait(self, timeout=None):
+        """Block until the background loads started by start() have finished"""
+        for thread in self._threads:
+            thread.join(timeout)
+        return self.status()["ready"]
+
+    def status(self):
+        """Per-component state; ready when every eager component is loaded"""
+        components = {}
+        ready = True
+        for name, component in self._components.items():
+            components[name] = {
+                "state": component.state,
+                "mode": component.mode,
+                "load_time": round(component.load_time, 3) if component.load_time is not None else None,
+                "error": component.error,
+            }
+            # Unloaded components are reloaded on demand and do not block readiness
+            if component.state == FAILED or (component.mode == "eager" and component.state in (PENDING, LOADING)):
+                ready = False
+        return {"ready": ready, "components": components}
+
+    def proxy(self, name):
+        return ComponentProxy(self, name)
+
+
+class ComponentProxy:
+    """Attribute access is forwarded to the component, loading it on first use"""
+
+    def __init__(self, manager, name):
+        self._manager = manager
+        self._name = name
+
+    def __getattr__(self, attr):
+        return getattr(self._manager.get(self._name), attr)
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Local model server shared by every web worker.
+
+Usage:
+  MODEL_SERVER_SOCKET=/tmp/chatbot-models.sock python model_server.py
+
+The GPU models (Whisper ASR and the bge-reranker cross-encoder) are loaded
+once in this process instead of once per web worker. Workers started with the
+same MODEL_SERVER_SOCKET call them over a Unix socket through ModelClient:
+RemoteASR has the ASRWorker interface (submit/transcribe/stats) and
+RemoteCrossEncoder is a BaseCrossEncoder. Batching and the bounded ASR queue
+run here, so requests from all workers share one forward pass and one queue.
+
+CUDA cannot be used in a process forked after it was initialized, which is why
+the GPU models live here rather than being preloaded before gunicorn forks.
+"""
+
+import os
+import sys
+import threading
+import time
+from multiprocessing.connection import Client, Listener
+
+from langchain_community.cross_encoders.base import BaseCrossEncoder
+
+MODEL_SERVER_SOCKET = os.environ.get("MODEL_SERVER_SOCKET", "")
+MODEL_SERVER_AUTHKEY = os.environ.get("MODEL_SERVER_AUTHKEY", "chatbot-models").encode()
+
+
+class ModelClient:
+    """One connection per thread (and per process, connections do not survive fork)"""
+
+    def __init__(self, address=MODEL_SERVER_SOCKET, authkey=MODEL_SERVER_AUTHKEY):
+        self.address = address
+        self.authkey = authkey
+        self._local = threading.local()
+
+    def _connection(self):
+        if getattr(self._local, "pid", None) != os.getpid():
+            self._local.connection = Client(self.address, family="AF_UNIX", authkey=self.authkey)
+            self._local.pid = os.getpid()
+        return self._local.connection
+
+    def call(self, method, *args):
+        connection = self._connection()
+        try:
+            connection.send((method, args))
+            status, result = connection.recv()
+        except (EOFError, OSError):
+            # Reconnect on the next call, e.g. after the model server restarted
+            self._local.pid = None
+            raise
+        if status == "error":
+            raise result
+        return result
+
+    def ping(self):
+        return self.call("ping")
+
+
+class RemoteASR:
+    """ASRWorker interface backed by the model server's ASR queue"""
+
+    def __init__(self, client):
+        self.client = client
+
+    @property
+    def name(self):
+        return self.client.call("asr_name")
+
+    def submit(self, audio, language="zh"):
+        """Transcribe audio; returns (text, queue_wait, decode_time)"""
+        return self.client.call("asr", audio, language)
+
+    def transcribe(self, audio, language="zh"):
+        return self.submit(audio, language)[0]
+
+    def stats(self):
+        return self.client.call("asr_stats")
+
+
+class RemoteCrossEncoder(BaseCrossEncoder):
+    """Cross-encoder scores computed by the model server"""
+
+    def __init__(self, client):
+        self.client = client
+
+    def score(self, text_pairs):
+        return self.client.call("rerank", [tuple(pair) for pair in text_pairs])
+
+    def stats(self):
+        return self.client.call("rerank_stats")
+
+
+class ModelServer:
+    """Serves the loaded models to ModelClient connections, one thread per connection"""
+
+    def __init__(self, asr, reranker):
+        self.asr = asr
+        self.reranker = reranker
+        self.methods = {
+            "ping": lambda: True,
+            "asr": self.asr.submit,
+            "asr_name": lambda: self.asr.name,
+            "asr_stats": self.asr.stats,
+            "rerank": lambda pairs: [float(score) for score in self.reranker.score(pairs)],
+            "rerank_stats": lambda: self.reranker.stats() if hasattr(self.reranker, "stats") else None,
+        }
+
+    def handle(self, connection):
+        with connection:
+            while True:
+                try:
+                    method, args = connection.recv()
+                except (EOFError, OSError):
+                    return
+                try:
+                    reply = ("ok", self.methods[method](*args))
+                except Exception as e:
+                    reply = ("error", e)
+                try:
+                    connection.send(reply)
+                except (EOFError, OSError):
+                    return
+                except Exception as e:
+                    # Result or exception that cannot be pickled
+                    connection.send(("error", RuntimeError(f"Model server reply could not be sent: {e}")))
+
+    def serve_forever(self, address=MODEL_SERVER_SOCKET, authkey=MODEL_SERVER_AUTHKEY):
+        if os.path.exists(address):
+            os.unlink(address)
+        # The socket only appears once the models are loaded, entrypoint.sh waits for it
+        with Listener(address, family="AF_UNIX", authkey=authkey) as listener:
+            print(f"✅ Model server listening on {address}")
+            while True:
+                try:
+                    connection = listener.accept()
+                except Exception as e:
+                    print(f"⚠️  Model server rejected a connection: {e}")
+                    continue
+                threading.Thread(target=self.handle, args=(connection,), daemon=True).start()
+
+
+def main(argv):
+    if not MODEL_SERVER_SOCKET:
+        print("MODEL_SERVER_SOCKET is not set")
+        return 2
+
+    from asr_engines import load_asr_engine
+    from asr_worker import ASRWorker
+    from reranker_backends import load_cross_encoder, RERANKER_BACKEND, RERANKER_MODEL
+    from rerank_service import BatchingCrossEncoder, RERANK_BATCHING
+
+    start_time = time.time()
+    asr = ASRWorker(load_asr_engine())
+    print(f"✅ Loaded ASR ({asr.name}): {time.time() - start_time:.2f}s")
+
+    start_time = time.time()
+    reranker = load_cross_encoder()
+    if RERANK_BATCHING:
+        reranker = BatchingCrossEncoder(reranker)
+    print(f"✅ Loaded reranker {RERANKER_MODEL} ({RERANKER_BACKEND}): {time.time() - start_time:.2f}s")
+
+    ModelServer(asr, reranker).serve_forever()
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main(sys.argv))
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""Pre-generate answers for the curated question banks.
+
+Usage:
+  python pregenerate_answers.py [--domains gdm ckd ppd] [--concurrency 2] [--force]
+
+Behavior:
+  - Runs every question of each domain's question file through the same qa_chain
+    and post-processing (<think> stripping + OpenCC s2twp) as /ask.
+  - Only questions that are new, or whose domain version (prompt template, chat
+    model, FAISS index) changed, are regenerated; --force regenerates everything.
+  - Questions removed from the question file are dropped from the store.
+  - Results are written to answer_store/<domain>.json, served by /ask.
+"""
+import argparse
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from answer_store import AnswerStore, ANSWER_STORE_DIR, domain_version
+from llm_scheduler import llm_priority, BATCH
+
+
+def read_questions(filename):
+    with open(filename, 'r', encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def generate_domain(registry, model_type, store, converter, concurrency, force):
+    from shared_models import shared_chat_model
+    from streaming import strip_think
+    from domains import prompt_text
+
+    config = registry.config(model_type)
+    qa_chain = registry.get(model_type)["qa_chain"]
+    version = domain_version(prompt_text(config), config["faiss_path"], shared_chat_model.model)
+
+    questions = read_questions(config["question_file"])
+    existing = {entry["q"]: entry for entry in store.load(model_type)}
+    entries = {}
+    todo = []
+    for question in dict.fromkeys(questions):
+        entry = existing.get(question)
+        if entry is not None and entry["v"] == version and not force:
+            entries[question] = entry
+        else:
+            todo.append(question)
+    print(f"[{model_type}] version={version} questions={len(questions)} regenerate={len(todo)}")
+
+    def answer(question):
+        start_time = time.time()
+        # Lowest priority: live chat requests on the same Ollama go first
+        with llm_priority(BATCH):
+            raw = qa_chain.invoke(question)
+        return converter.convert(strip_think(raw)).strip(), time.time() - start_time
+
+    failed = 0
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = {executor.submit(answer, question): question for question in todo}
+        for done, future in enumerate(as_completed(futures), 1):
+            question = futures[future]
+            try:
+                text, elapsed = future.result()
+            except Exception as e:
+                failed += 1
+                print(f"❌ [{model_type}] {question}: {e}")
+                continue
+            entries[question] = {"q": question, "v": version, "a": text}
+            print(f"✅ [{model_type}] {done}/{len(todo)} {elapsed:.1f}s {question}")
+
+    # Keep the question-file order in the store
+    store.save(model_type, [entries[q] for q in dict.fromkeys(questions) if q in entries])
+    return failed
+
+
+def main(argv):
+    from shared_models import model_manager
+    from domains import DomainRegistry
+    registry = DomainRegistry(model_manager)
+
+    parser = argparse.ArgumentParser(description="Pre-generate answers for the question banks")
+    parser.add_argument("--domains", nargs="+", default=registry.names(), choices=registry.names())
+    parser.add_argument("--concurrency", type=int, default=2, help="concurrent qa_chain calls")
+    parser.add_argument("--store-dir", default=ANSWER_STORE_DIR)
+    parser.add_argument("--force", action="store_true", help="regenerate every answer")
+    args = parser.parse_args(argv[1:])
+
+    from opencc import OpenCC
+    converter = OpenCC('s2twp')
+    store = AnswerStore(args.store_dir)
+
+    failed = 0
+    for model_type in args.domains:
+        failed += generate_domain(registry, model_type, store, converter, max(1, args.concurrency), args.force)
+    print(f"Finished, {failed} failed")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main(sys.argv))
@@ -0,0 +1,188 @@
+"""
+Follow-up question suggestions for /related.
+
+Fast path: the nearest neighbours of the question in the domain's question
+bank, by bge-m3 embeddings of the bank computed once and kept in
+RELATED_EMBEDDING_DIR (<domain>.npy + <domain>.json, recomputed when the
+question file changes). No LLM call is needed for this.
+
+Only when the bank has too few close questions the domain's
+related_question_chain is asked, at RELATED priority in the LLM scheduler so
+it never delays a chat answer. Its suggestions are cached per (domain,
+normalized question).
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from answer_store import normalize_question
+
+RELATED_EMBEDDING_DIR = os.environ.get("RELATED_EMBEDDING_DIR", "question_embeddings")
+RELATED_COUNT = int(os.environ.get("RELATED_COUNT", "5"))
+RELATED_MIN_SIMILARITY = float(os.environ.get("RELATED_MIN_SIMILARITY", "0.55"))
+RELATED_MIN_RESULTS = int(os.environ.get("RELATED_MIN_RESULTS", "3"))
+RELATED_CACHE_MAX_ENTRIES = int(os.environ.get("RELATED_CACHE_MAX_ENTRIES", "2000"))
+# Bank questions at least this similar are the question itself, not a follow-up
+_SAME_QUESTION_SIMILARITY = 0.97
+
+# "1. ", "1）", "- ", "• ", "Q1:" ...
+_LIST_PREFIX = re.compile(r"^\s*(?:[-*•·]|\(?\d+[.)、）:：]|Q\d+[.:：])\s*")
+
+
+def parse_questions(text):
+    """Follow-up questions from the free-form LLM output, one per line"""
+    questions = []
+    for line in text.splitlines():
+        line = _LIST_PREFIX.sub("", line).strip().strip('"“”')
+        if len(line) < 4 or line.endswith((":", "：")):
+            continue
+        questions.append(line)
+    # Drop intro/outro sentences when the model did write its questions with a question mark
+    marked = [question for question in questions if question.endswith(("?", "？"))]
+    return marked or questions
+
+
+class _Bank:
+    def __init__(self, questions, matrix, digest):
+        self.questions = questions
+        self.digest = digest
+        self.normalized = [normalize_question(question) for question in questions]
+        self.matrix = matrix
+
+
+class RelatedQuestions:
+    """Question-bank nearest neighbours with a cached LLM fallback"""
+
+    def __init__(self, embeddings, directory=RELATED_EMBEDDING_DIR, count=RELATED_COUNT,
+                 min_similarity=RELATED_MIN_SIMILARITY, min_results=RELATED_MIN_RESULTS,
+                 max_cache_entries=RELATED_CACHE_MAX_ENTRIES):
+        self.embeddings = embeddings
+        self.directory = directory
+        self.count = count
+        self.min_similarity = min_similarity
+        self.min_results = min_results
+        self.max_cache_entries = max_cache_entries
+        self._banks = {}
+        self._bank_lock = threading.Lock()
+        self._cache = OrderedDict()  # (domain, normalized question) -> [questions]
+        self._cache_lock = threading.Lock()
+        self.bank_hits = 0
+        self.cache_hits = 0
+        self.generated = 0
+
+    def _paths(self, domain):
+        return (os.path.join(self.directory, f"{domain}.npy"),
+                os.path.join(self.directory, f"{domain}.json"))
+
+    def bank(self, domain, questions):
+        """Embeddings of the question bank, loaded from disk or computed once"""
+        digest = hashlib.sha256("\n".join(questions).encode("utf-8")).hexdigest()[:16]
+        bank = self._banks.get(domain)
+        if bank is not None and bank.digest == digest:
+            return bank
+        with self._bank_lock:
+            bank = self._banks.get(domain)
+            if bank is not None and bank.digest == digest:
+                return bank
+            matrix_path, meta_path = self._paths(domain)
+            matrix = None
+            try:
+                with open(meta_path, "r", encoding="utf-8") as f:
+                    if json.load(f).get("digest") == digest:
+                        matrix = np.load(matrix_path)
+            except (OSError, ValueError):
+                pass
+            if matrix is None:
+                print(f"🔄 Embedding {len(questions)} bank questions for {domain}...")
+                matrix = np.asarray(self.embeddings.embed_documents(questions), dtype=np.float32)
+                norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+                matrix = matrix / np.where(norms > 0, norms, 1.0)
+                # Every worker may embed the bank at startup, replace the files atomically
+                os.makedirs(self.directory, exist_ok=True)
+                suffix = f".{os.getpid()}.tmp"
+                with open(matrix_path + suffix, "wb") as f:
+                    np.save(f, matrix)
+                os.replace(matrix_path + suffix, matrix_path)
+                with open(meta_path + suffix, "w", encoding="utf-8") as f:
+                    json.dump({"digest": digest, "questions": questions}, f, ensure_ascii=False)
+                os.replace(meta_path + suffix, meta_path)
+            bank = _Bank(questions, matrix, digest)
+            self._banks[domain] = bank
+            return bank
+
+    def nearest(self, domain, questions, question, count=None):
+        """Bank questions closest to question, excluding the question itself"""
+        count = count or self.count
+        if not questions:
+            return []
+        bank = self.bank(domain, questions)
+        query = np.asarray(self.embeddings.embed_query(question), dtype=np.float32)
+        query /= max(float(np.linalg.norm(query)), 1e-12)
+        scores = bank.matrix @ query
+        normalized = normalize_question(question)
+        results = []
+        for index in np.argsort(-scores):
+            score = float(scores[index])
+            if score < self.min_similarity:
+                break
+            if score >= _SAME_QUESTION_SIMILARITY or bank.normalized[index] == normalized:
+                continue
+            results.append(bank.questions[index])
+            if len(results) >= count:
+                break
+        return results
+
+    def _cached(self, key):
+        with self._cache_lock:
+            questions = self._cache.get(key)
+            if questions is not None:
+                self._cache.move_to_end(key)
+            return questions
+
+    def _store(self, key, questions):
+        with self._cache_lock:
+            self._cache[key] = questions
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_cache_entries:
+                self._cache.popitem(last=False)
+
+    def related(self, domain, questions, question, generate, count=None):
+        """(questions, source) with source question_bank, cache or llm.
+
+        generate(question) -> raw LLM text is only called on a bank miss.
+        """
+        count = count or self.count
+        nearest = self.nearest(domain, questions, question, count)
+        if len(nearest) >= min(count, self.min_results):
+            self.bank_hits += 1
+            return nearest, "question_bank"
+
+        key = (domain, normalize_question(question))
+        cached = self._cached(key)
+        if cached is not None:
+            self.cache_hits += 1
+            return cached[:count], "cache"
+
+        generated = parse_questions(generate(question))
+        if not generated:
+            return nearest, "question_bank"
+        self.generated += 1
+        self._store(key, generated)
+        return generated[:count], "llm"
+
+    def stats(self):
+        with self._cache_lock:
+            cached = len(self._cache)
+        return {
+            "banks": sorted(self._banks),
+            "bank_hits": self.bank_hits,
+            "cache_hits": self.cache_hits,
+            "generated": self.generated,
+            "cached": cached,
+        }
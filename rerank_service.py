@@ -0,0 +1,239 @@
+"""
+Micro-batching service and score cache for the bge-reranker cross-encoder.
+
+Every request used to run its own cross-encoder forward pass over its 10 FAISS
+hits, and under concurrent load those passes serialized on the model. This
+wrapper collects (query, passage) pairs from concurrent requests for a short
+window, scores them in one padded batch and hands each caller its own scores.
+
+Popular questions also retrieve the same chunks again and again, so scores are
+cached per (normalized query, document id) and only cache misses are scored.
+"""
+
+import hashlib
+import operator
+import os
+import queue
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Optional
+
+from langchain_community.cross_encoders.base import BaseCrossEncoder
+from langchain_core.documents import Document
+from langchain_classic.retrievers.document_compressors import CrossEncoderReranker
+
+RERANK_BATCHING = os.environ.get("RERANK_BATCHING", "true").lower() == "true"
+RERANK_MAX_BATCH = int(os.environ.get("RERANK_MAX_BATCH", "64"))  # pairs per forward pass
+RERANK_BATCH_WAIT_MS = float(os.environ.get("RERANK_BATCH_WAIT_MS", "5"))
+RERANK_CACHE = os.environ.get("RERANK_CACHE", "true").lower() == "true"
+RERANK_CACHE_MAX_ENTRIES = int(os.environ.get("RERANK_CACHE_MAX_ENTRIES", "200000"))
+RERANK_CACHE_MAX_BYTES = int(os.environ.get("RERANK_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+# Approximate per-entry overhead of the OrderedDict node, tuple and float
+_ENTRY_OVERHEAD = 160
+
+
+class _ScoreRequest:
+    def __init__(self, pairs):
+        self.pairs = pairs
+        self.scores = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class BatchingCrossEncoder(BaseCrossEncoder):
+    """Drop-in cross-encoder that coalesces concurrent score() calls"""
+
+    def __init__(self, model, max_batch=RERANK_MAX_BATCH, wait_ms=RERANK_BATCH_WAIT_MS):
+        self.model = model
+        self.max_batch = max_batch
+        self.wait = wait_ms / 1000.0
+        self._queue = queue.Queue()
+        self._worker = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._batches = 0
+        self._pairs = 0
+        self._requests = 0
+        self._max_batch_seen = 0
+        self._last_batch = 0
+
+    def score(self, text_pairs):
+        text_pairs = list(text_pairs)
+        if not text_pairs:
+            return []
+        self._ensure_worker()
+        request = _ScoreRequest(text_pairs)
+        self._queue.put(request)
+        request.done.wait()
+        if request.error is not None:
+            raise request.error
+        return request.scores
+
+    def _ensure_worker(self):
+        if self._worker is not None:
+            return
+        with self._start_lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name="rerank-batcher", daemon=True)
+                self._worker.start()
+
+    def _collect(self):
+        """Block for one request, then gather more until the window or batch is full"""
+        batch = [self._queue.get()]
+        size = len(batch[0].pairs)
+        deadline = time.monotonic() + self.wait
+        while size < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(request)
+            size += len(request.pairs)
+        return batch, size
+
+    def _run(self):
+        while True:
+            batch, size = self._collect()
+            pairs = [pair for request in batch for pair in request.pairs]
+            try:
+                scores = list(self.model.score(pairs))
+                offset = 0
+                for request in batch:
+                    request.scores = scores[offset:offset + len(request.pairs)]
+                    offset += len(request.pairs)
+            except Exception as e:
+                for request in batch:
+                    request.error = e
+            with self._stats_lock:
+                self._batches += 1
+                self._pairs += size
+                self._requests += len(batch)
+                self._last_batch = size
+                self._max_batch_seen = max(self._max_batch_seen, size)
+            for request in batch:
+                request.done.set()
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                "queue_depth": self._queue.qsize(),
+                "batches": self._batches,
+                "requests": self._requests,
+                "pairs": self._pairs,
+                "avg_batch_size": self._pairs / self._batches if self._batches else 0.0,
+                "avg_requests_per_batch": self._requests / self._batches if self._batches else 0.0,
+                "last_batch_size": self._last_batch,
+                "max_batch_size": self._max_batch_seen,
+                "max_batch": self.max_batch,
+                "wait_ms": self.wait * 1000.0,
+            }
+
+
+def normalize_query(text):
+    """NFKC and collapsed whitespace; punctuation is kept since it changes the score"""
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFKC", text or "")).strip()
+
+
+def document_key(doc):
+    """Stable identifier of a FAISS docstore chunk, content hash as a fallback"""
+    doc_id = getattr(doc, "id", None)
+    if doc_id:
+        return str(doc_id)
+    return hashlib.sha1(doc.page_content.encode("utf-8")).hexdigest()
+
+
+class RerankScoreCache:
+    """LRU cache of cross-encoder scores bounded by entries and bytes"""
+
+    def __init__(self, max_entries=RERANK_CACHE_MAX_ENTRIES, max_bytes=RERANK_CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._scores = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def query_hash(query):
+        return hashlib.sha1(normalize_query(query).encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _size(key):
+        return _ENTRY_OVERHEAD + len(key[0]) + len(key[1])
+
+    def get_many(self, keys):
+        """Cached score per key, None for misses"""
+        scores = []
+        with self._lock:
+            for key in keys:
+                score = self._scores.get(key)
+                if score is None:
+                    self.misses += 1
+                else:
+                    self._scores.move_to_end(key)
+                    self.hits += 1
+                scores.append(score)
+        return scores
+
+    def put_many(self, items):
+        with self._lock:
+            for key, score in items:
+                if key in self._scores:
+                    self._scores.move_to_end(key)
+                else:
+                    self._bytes += self._size(key)
+                self._scores[key] = float(score)
+            while self._scores and (len(self._scores) > self.max_entries or self._bytes > self.max_bytes):
+                old_key, _ = self._scores.popitem(last=False)
+                self._bytes -= self._size(old_key)
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / total if total else 0.0,
+                "entries": len(self._scores),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+            }
+
+
+class CachingCrossEncoderReranker(CrossEncoderReranker):
+    """CrossEncoderReranker that only scores (query, document) pairs missing from the cache"""
+
+    score_cache: Optional[Any] = None
+
+    def compress_documents(self, documents, query, callbacks=None):
+        documents = list(documents)
+        if not documents:
+            return []
+        if self.score_cache is None:
+            scores = self.model.score([(query, doc.page_content) for doc in documents])
+        else:
+            query_hash = self.score_cache.query_hash(query)
+            keys = [(query_hash, document_key(doc)) for doc in documents]
+            scores = self.score_cache.get_many(keys)
+            missing = [index for index, score in enumerate(scores) if score is None]
+            if missing:
+                fresh = self.model.score([(query, documents[index].page_content) for index in missing])
+                for index, score in zip(missing, fresh):
+                    scores[index] = float(score)
+                self.score_cache.put_many([(keys[index], scores[index]) for index in missing])
+        docs_with_scores = list(zip(documents, scores))
+        result = sorted(docs_with_scores, key=operator.itemgetter(1), reverse=True)
+        # Scores go on copies, documents may be shared with the docstore
+        return [
+            Document(id=doc.id, page_content=doc.page_content,
+                     metadata={**doc.metadata, "relevance_score": float(score)})
+            for doc, score in result[: self.top_n]
+        ]
@@ -0,0 +1,75 @@
+"""
+Pluggable backends for the bge-reranker-v2-m3 cross-encoder.
+
+RERANKER_BACKEND selects the implementation:
+  - torch      HuggingFaceCrossEncoder in full precision (default)
+  - onnx       ONNX Runtime export of the same model
+  - onnx-int8  ONNX Runtime with int8 dynamically-quantized weights
+
+The ONNX files are produced by `python reranker_tools.py export`.
+"""
+
+import os
+
+from langchain_community.cross_encoders.base import BaseCrossEncoder
+
+RERANKER_MODEL = os.environ.get("RERANKER_MODEL", "BAAI/bge-reranker-v2-m3")
+RERANKER_BACKEND = os.environ.get("RERANKER_BACKEND", "torch")
+RERANKER_ONNX_DIR = os.environ.get("RERANKER_ONNX_DIR", "models/bge-reranker-v2-m3-onnx")
+RERANKER_ONNX_THREADS = int(os.environ.get("RERANKER_ONNX_THREADS", "0"))  # 0 = onnxruntime default
+RERANKER_MAX_LENGTH = 512
+
+BACKENDS = ("torch", "onnx", "onnx-int8")
+ONNX_FILES = {"onnx": "model.onnx", "onnx-int8": "model.int8.onnx"}
+
+
+class OnnxCrossEncoder(BaseCrossEncoder):
+    """Cross-encoder running an exported model with ONNX Runtime on CPU"""
+
+    def __init__(self, model_path, tokenizer_path, threads=RERANKER_ONNX_THREADS,
+                 max_length=RERANKER_MAX_LENGTH):
+        try:
+            import numpy as np
+            import onnxruntime as ort
+            from transformers import AutoTokenizer
+        except Exception as e:
+            raise RuntimeError("onnxruntime and transformers are required for the ONNX reranker. "
+                               "Install with: pip install onnxruntime transformers") from e
+
+        self._np = np
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads > 0:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {item.name for item in self.session.get_inputs()}
+        self.tokenizer = AutoTokenizer.from_pretrained(tokenizer_path)
+        self.max_length = max_length
+
+    def score(self, text_pairs):
+        text_pairs = list(text_pairs)
+        if not text_pairs:
+            return []
+        np = self._np
+        queries = [pair[0] for pair in text_pairs]
+        passages = [pair[1] for pair in text_pairs]
+        encoded = self.tokenizer(queries, passages, padding=True, truncation=True,
+                                 max_length=self.max_length, return_tensors="np")
+        inputs = {name: value.astype(np.int64) for name, value in encoded.items() if name in self.input_names}
+        logits = self.session.run(None, inputs)[0].reshape(len(text_pairs), -1)[:, 0]
+        # Same sigmoid activation as sentence-transformers' CrossEncoder.predict
+        return (1.0 / (1.0 + np.exp(-logits))).tolist()
+
+
+def load_cross_encoder(backend=RERANKER_BACKEND, model_name=RERANKER_MODEL, onnx_dir=RERANKER_ONNX_DIR):
+    """Create the cross-encoder of the selected backend"""
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown RERANKER_BACKEND {backend!r}, expected one of {', '.join(BACKENDS)}")
+    if backend == "torch":
+        from langchain_community.cross_encoders import HuggingFaceCrossEncoder
+        return HuggingFaceCrossEncoder(model_name=model_name)
+
+    model_path = os.path.join(onnx_dir, ONNX_FILES[backend])
+    if not os.path.exists(model_path):
+        raise FileNotFoundError(f"{model_path} not found, run: python reranker_tools.py export")
+    return OnnxCrossEncoder(model_path, onnx_dir)
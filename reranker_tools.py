@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""Export and validate the ONNX Runtime reranker backends.
+
+Usage:
+  python reranker_tools.py export [--output models/bge-reranker-v2-m3-onnx] [--no-quantize]
+  python reranker_tools.py parity [--backends onnx onnx-int8] [--domains gdm ckd ppd] [--limit 50]
+
+export:
+  - Exports BAAI/bge-reranker-v2-m3 to ONNX (model.onnx) and saves the tokenizer.
+  - Writes an int8 dynamically-quantized copy (model.int8.onnx). Dynamic
+    quantization computes activation ranges at runtime, so no calibration set
+    is needed; the parity check below is what validates the result.
+
+parity:
+  - Retrieves the FAISS top-k for every question-bank question, scores the pairs
+    with the FP32 PyTorch model and with each candidate backend, and reports
+    top-n agreement, exact top-n order matches, rerank latency and RSS.
+  - Every backend is loaded and run in its own freshly spawned process, so the
+    RSS columns (growth after loading, peak while scoring) are not skewed by
+    memory a previous backend left behind in the allocator.
+"""
+import argparse
+import multiprocessing
+import os
+import resource
+import sys
+import time
+
+from reranker_backends import RERANKER_MODEL, RERANKER_ONNX_DIR, ONNX_FILES, load_cross_encoder
+
+
+def current_rss_mb():
+    """Resident set size of this process (Linux)"""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError):
+        return float("nan")
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process (ru_maxrss is in KB on Linux)"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def export(output_dir, model_name=RERANKER_MODEL, quantize=True, opset=17):
+    try:
+        import torch
+        from transformers import AutoTokenizer, AutoModelForSequenceClassification
+    except Exception as e:
+        raise RuntimeError("torch and transformers are required to export. Install with: pip install torch transformers") from e
+
+    os.makedirs(output_dir, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModelForSequenceClassification.from_pretrained(model_name).eval()
+
+    onnx_path = os.path.join(output_dir, ONNX_FILES["onnx"])
+    dummy = tokenizer(["妊娠期糖尿病的飲食"], ["檢索到的文件內容"], return_tensors="pt")
+    print(f"Exporting {model_name} to {onnx_path}...")
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            (dummy["input_ids"], dummy["attention_mask"]),
+            onnx_path,
+            input_names=["input_ids", "attention_mask"],
+            output_names=["logits"],
+            dynamic_axes={
+                "input_ids": {0: "batch", 1: "sequence"},
+                "attention_mask": {0: "batch", 1: "sequence"},
+                "logits": {0: "batch"},
+            },
+            opset_version=opset,
+        )
+    tokenizer.save_pretrained(output_dir)
+
+    if quantize:
+        try:
+            from onnxruntime.quantization import quantize_dynamic, QuantType
+        except Exception as e:
+            raise RuntimeError("onnxruntime is required to quantize. Install with: pip install onnxruntime") from e
+        int8_path = os.path.join(output_dir, ONNX_FILES["onnx-int8"])
+        print(f"Quantizing weights to int8: {int8_path}...")
+        quantize_dynamic(onnx_path, int8_path, weight_type=QuantType.QInt8)
+    print(f"Wrote ONNX reranker to {output_dir}")
+
+
+def load_pairs(domains, k, limit):
+    """(question, [passages]) for every question-bank question, from the FAISS top-k"""
+    from shared_models import shared_embeddings
+    from domains import DOMAINS, load_vector_store
+
+    samples = []
+    for name in domains:
+        config = DOMAINS[name]
+        vector_store = load_vector_store(config["faiss_path"], shared_embeddings)
+        with open(config["question_file"], 'r', encoding='utf-8') as f:
+            questions = [line.strip() for line in f if line.strip()]
+        for question in questions[:limit] if limit else questions:
+            docs = vector_store.similarity_search(question, k=k)
+            samples.append((question, [doc.page_content for doc in docs]))
+        print(f"[{name}] {len(questions)} questions")
+    return samples
+
+
+def top_indices(scores, top_n):
+    return sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)[:top_n]
+
+
+def run_backend(model, samples):
+    """Scores per sample and the mean rerank latency in ms"""
+    results = []
+    elapsed = 0.0
+    for question, passages in samples:
+        start_time = time.perf_counter()
+        results.append(list(model.score([(question, passage) for passage in passages])))
+        elapsed += time.perf_counter() - start_time
+    return results, 1000.0 * elapsed / max(1, len(samples))
+
+
+def measure_backend(backend, samples):
+    """Load and run one backend; called in a fresh process by parity()"""
+    rss_before = current_rss_mb()
+    model = load_cross_encoder(backend)
+    rss_loaded = current_rss_mb() - rss_before
+    scores, latency = run_backend(model, samples)
+    return scores, latency, rss_loaded, peak_rss_mb()
+
+
+def parity(backends, domains, k=10, top_n=5, limit=None):
+    samples = [sample for sample in load_pairs(domains, k, limit) if sample[1]]
+    if not samples:
+        print("No samples to compare")
+        return 1
+
+    context = multiprocessing.get_context("spawn")
+
+    def measure(backend):
+        # One process per backend: after `del model` the allocator keeps the
+        # freed pages, so measuring the next backend in this process is meaningless
+        with context.Pool(1) as pool:
+            return pool.apply(measure_backend, (backend, samples))
+
+    reference_scores, reference_latency, rss_loaded, rss_peak = measure("torch")
+    report = [("torch", 1.0, 1.0, reference_latency, rss_loaded, rss_peak)]
+
+    for backend in backends:
+        scores, latency, rss_loaded, rss_peak = measure(backend)
+        overlap = exact = 0.0
+        for expected, actual in zip(reference_scores, scores):
+            expected_top = top_indices(expected, top_n)
+            actual_top = top_indices(actual, top_n)
+            overlap += len(set(expected_top) & set(actual_top)) / len(expected_top)
+            exact += expected_top == actual_top
+        report.append((backend, overlap / len(samples), exact / len(samples), latency, rss_loaded, rss_peak))
+
+    print(f"\n{len(samples)} questions, top-{top_n} of {k} FAISS hits")
+    print(f"{'backend':<10} {'top-n agree':>12} {'exact order':>12} {'latency ms':>11} {'speedup':>8} "
+          f"{'RSS MB':>8} {'peak MB':>8}")
+    for backend, agreement, exact_order, latency, rss_mb, peak_mb in report:
+        print(f"{backend:<10} {agreement:>12.3f} {exact_order:>12.3f} {latency:>11.1f} "
+              f"{reference_latency / latency:>8.2f} {rss_mb:>8.0f} {peak_mb:>8.0f}")
+    return 0
+
+
+def main(argv):
+    from domains import DOMAINS
+
+    parser = argparse.ArgumentParser(description="Export and validate ONNX reranker backends")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subparsers.add_parser("export", help="export ONNX and int8 models")
+    export_parser.add_argument("--output", default=RERANKER_ONNX_DIR)
+    export_parser.add_argument("--model", default=RERANKER_MODEL)
+    export_parser.add_argument("--no-quantize", action="store_true")
+
+    parity_parser = subparsers.add_parser("parity", help="compare backends against the FP32 model")
+    parity_parser.add_argument("--backends", nargs="+", default=["onnx", "onnx-int8"], choices=list(ONNX_FILES))
+    parity_parser.add_argument("--domains", nargs="+", default=list(DOMAINS), choices=list(DOMAINS))
+    parity_parser.add_argument("--k", type=int, default=10)
+    parity_parser.add_argument("--top-n", type=int, default=5)
+    parity_parser.add_argument("--limit", type=int, default=None, help="questions per domain")
+
+    args = parser.parse_args(argv[1:])
+    if args.command == "export":
+        export(args.output, args.model, quantize=not args.no_quantize)
+        return 0
+    return parity(args.backends, args.domains, args.k, args.top_n, args.limit)
+
+
+if __name__ == '__main__':
+    raise SystemExit(main(sys.argv))
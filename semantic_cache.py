@@ -0,0 +1,236 @@
+"""
+Semantic answer cache keyed on bge-m3 query embeddings.
+
+Near-identical questions (most of them come from the question banks) reuse the
+stored, post-processed answer instead of paying for retrieval, rerank and a
+full qwen3 generation. Each model_type gets its own namespace, and every
+entry records the domain version (prompt, chat model, index; see
+answer_store.domain_version) it was generated with: entries of another version
+or past their TTL are dropped before the best match is chosen, so persisted
+answers do not outlive a prompt change or an index rebuild.
+
+With SEMANTIC_CACHE_DIR several worker processes share the files: a save
+holds an fcntl lock on <namespace>.lock and merges the entries other workers
+wrote since (newest per query wins) before rewriting them, so workers do not
+drop each other's answers.
+"""
+
+import fcntl
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+SEMANTIC_CACHE_ENABLED = os.environ.get("SEMANTIC_CACHE_ENABLED", "true").lower() == "true"
+SEMANTIC_CACHE_THRESHOLD = float(os.environ.get("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.environ.get("SEMANTIC_CACHE_MAX_ENTRIES", "1000"))
+SEMANTIC_CACHE_TTL = float(os.environ.get("SEMANTIC_CACHE_TTL", "86400"))
+# Directory for on-disk persistence, empty to keep the cache in memory only
+SEMANTIC_CACHE_DIR = os.environ.get("SEMANTIC_CACHE_DIR", "")
+
+
+def _normalize(vector):
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm > 0 else vector
+
+
+class _Namespace:
+    """Entries of one model_type, ordered from least to most recently used."""
+
+    def __init__(self):
+        self.entries = OrderedDict()  # query -> {"answer", "created", "version"}
+        self.embeddings = {}          # query -> normalized float32 vector
+        self.removed = {}             # query -> created of the entry removed since the last save
+        self._matrix = None
+        self._keys = []
+
+    def invalidate(self):
+        self._matrix = None
+
+    def matrix(self):
+        if self._matrix is None:
+            self._keys = list(self.entries)
+            if self._keys:
+                self._matrix = np.stack([self.embeddings[key] for key in self._keys])
+            else:
+                self._matrix = np.zeros((0, 0), dtype=np.float32)
+        return self._matrix, self._keys
+
+    def remove(self, query):
+        entry = self.entries.pop(query, None)
+        if entry is not None:
+            self.removed[query] = entry["created"]
+        self.embeddings.pop(query, None)
+        self.invalidate()
+
+
+class SemanticCache:
+    """Nearest-neighbour answer cache with LRU/TTL eviction."""
+
+    def __init__(self, embeddings, threshold=SEMANTIC_CACHE_THRESHOLD,
+                 max_entries=SEMANTIC_CACHE_MAX_ENTRIES, ttl=SEMANTIC_CACHE_TTL,
+                 cache_dir=SEMANTIC_CACHE_DIR):
+        self.embeddings = embeddings
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.cache_dir = cache_dir
+        self._namespaces = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _namespace(self, name):
+        namespace = self._namespaces.get(name)
+        if namespace is None:
+            namespace = _Namespace()
+            self._namespaces[name] = namespace
+            if self.cache_dir:
+                self._load(name, namespace)
+        return namespace
+
+    def _expired(self, entry, now):
+        return self.ttl > 0 and now - entry["created"] > self.ttl
+
+    def _purge(self, namespace, version, now):
+        """Remove expired entries and entries of another domain version"""
+        stale = [key for key, entry in namespace.entries.items()
+                 if self._expired(entry, now) or (version is not None and entry.get("version") != version)]
+        for key in stale:
+            namespace.remove(key)
+        return len(stale)
+
+    def embed(self, query):
+        return _normalize(self.embeddings.embed_query(query))
+
+    def lookup(self, name, query, version=None):
+        """Return (answer, embedding). answer is None on a miss.
+
+        The embedding is returned so that store() can reuse it. With a version,
+        only answers generated with that domain version are considered.
+        """
+        embedding = self.embed(query)
+        now = time.time()
+        with self._lock:
+            namespace = self._namespace(name)
+            if self._purge(namespace, version, now) and self.cache_dir:
+                self._save(name, namespace, version)
+            matrix, keys = namespace.matrix()
+            if keys:
+                scores = matrix @ embedding
+                best = int(np.argmax(scores))
+                key = keys[best]
+                entry = namespace.entries[key]
+                if scores[best] >= self.threshold:
+                    namespace.entries.move_to_end(key)
+                    self.hits += 1
+                    print(f"✅ Semantic cache hit [{name}] score={scores[best]:.3f}: {key}")
+                    return entry["answer"], embedding
+            self.misses += 1
+        return None, embedding
+
+    def store(self, name, query, answer, embedding=None, version=None):
+        if embedding is None:
+            embedding = self.embed(query)
+        with self._lock:
+            namespace = self._namespace(name)
+            namespace.entries[query] = {"answer": answer, "created": time.time(), "version": version}
+            namespace.entries.move_to_end(query)
+            namespace.embeddings[query] = _normalize(embedding)
+            while len(namespace.entries) > self.max_entries:
+                oldest = next(iter(namespace.entries))
+                namespace.remove(oldest)
+            namespace.invalidate()
+            if self.cache_dir:
+                self._save(name, namespace, version)
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / total if total else 0.0,
+                "entries": {name: len(ns.entries) for name, ns in self._namespaces.items()},
+            }
+
+    # Persistence: <name>.json holds queries/answers, <name>.npy the embeddings in the same order
+    def _paths(self, name):
+        base = os.path.join(self.cache_dir, name)
+        return base + ".json", base + ".npy"
+
+    def _read(self, name):
+        """[(query, entry, vector)] currently on disk"""
+        json_path, npy_path = self._paths(name)
+        if not (os.path.exists(json_path) and os.path.exists(npy_path)):
+            return []
+        try:
+            with open(json_path, "r", encoding="utf-8") as f:
+                records = json.load(f)["entries"]
+            matrix = np.load(npy_path)
+        except Exception as e:
+            print(f"⚠️  Could not load semantic cache {json_path}: {e}")
+            return []
+        return [
+            (record["query"],
+             {"answer": record["answer"], "created": record["created"], "version": record.get("version")},
+             vector.astype(np.float32))
+            for record, vector in zip(records, matrix)
+        ]
+
+    def _merge(self, name, namespace):
+        """Add the entries other processes saved, unless removed or replaced here since"""
+        now = time.time()
+        for query, entry, vector in self._read(name):
+            if self._expired(entry, now) or entry["created"] <= namespace.removed.get(query, -1):
+                continue
+            current = namespace.entries.get(query)
+            if current is not None and current["created"] >= entry["created"]:
+                continue
+            namespace.entries[query] = entry
+            namespace.embeddings[query] = vector
+            if current is None:
+                # Not used by this process yet: least recently used here
+                namespace.entries.move_to_end(query, last=False)
+        while len(namespace.entries) > self.max_entries:
+            namespace.remove(next(iter(namespace.entries)))
+        namespace.invalidate()
+
+    def _save(self, name, namespace, version=None):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with open(os.path.join(self.cache_dir, name + ".lock"), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                self._merge(name, namespace)
+                # Merged entries may be expired or of another version as well
+                self._purge(namespace, version, time.time())
+                self._write(name, namespace)
+                namespace.removed.clear()
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _write(self, name, namespace):
+        json_path, npy_path = self._paths(name)
+        keys = list(namespace.entries)
+        records = [{"query": key, **namespace.entries[key]} for key in keys]
+        matrix = np.stack([namespace.embeddings[key] for key in keys]) if keys else np.zeros((0, 0), dtype=np.float32)
+        with open(npy_path + ".tmp", "wb") as f:
+            np.save(f, matrix)
+        with open(json_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"version": 1, "entries": records}, f, ensure_ascii=False)
+        os.replace(npy_path + ".tmp", npy_path)
+        os.replace(json_path + ".tmp", json_path)
+
+    def _load(self, name, namespace):
+        now = time.time()
+        for query, entry, vector in self._read(name):
+            if self._expired(entry, now):
+                continue
+            namespace.entries[query] = entry
+            namespace.embeddings[query] = vector
+        if namespace.entries:
+            print(f"✅ Semantic cache [{name}] loaded {len(namespace.entries)} entries from {self._paths(name)[0]}")
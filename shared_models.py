@@ -1,41 +1,114 @@
 """
 Shared models initialization for all RAG inference modules.
 This file initializes common models once to save memory and improve performance.
+
+The Ollama clients are cheap and created at import time. The cross-encoder
+reranker is heavy and is loaded through model_manager (eagerly in the
+background or lazily on first use, see model_manager.py).
 """
 
 import os
+import time
+
+from model_manager import ModelManager
+
+# Keep qwen3 loaded between bursts: Ollama duration ("30m") or seconds, negative keeps it forever
+CHAT_KEEP_ALIVE = os.environ.get("CHAT_KEEP_ALIVE", "-1")
+# Fixed context window; a request with another num_ctx makes Ollama reload the model
+CHAT_NUM_CTX = int(os.environ.get("CHAT_NUM_CTX", "8192"))
+# Load qwen3 and prefill the domain system prompts at startup
+CHAT_WARMUP = os.environ.get("CHAT_WARMUP", "true").lower() == "true"
 
 print("Initializing shared models...")
 
+model_manager = ModelManager()
+
 try:
     from langchain_ollama import OllamaEmbeddings
     from langchain_ollama import ChatOllama
-    from langchain_classic.retrievers.document_compressors import  CrossEncoderReranker
-    from langchain_community.cross_encoders import HuggingFaceCrossEncoder
 
     # os.environ['CUDA_VISIBLE_DEVICES'] = '4'
 
+    from embedding_service import CachingEmbeddings, EMBED_CACHE
+    from llm_scheduler import llm_scheduler
+    from context_assembly import prompt_stats
+
+    def _generation_info(result):
+        return result.generations[0].generation_info if result.generations else None
+
+    class ScheduledChatOllama(ChatOllama):
+        """ChatOllama that holds an llm_scheduler slot while Ollama is generating,
+        and reports the prompt tokens Ollama evaluated (see context_assembly.py)"""
+
+        def _generate(self, *args, **kwargs):
+            with llm_scheduler.slot():
+                result = super()._generate(*args, **kwargs)
+            prompt_stats.record(_generation_info(result))
+            return result
+
+        def _stream(self, *args, **kwargs):
+            with llm_scheduler.slot():
+                for chunk in super()._stream(*args, **kwargs):
+                    prompt_stats.record(chunk.generation_info)
+                    yield chunk
+
+        async def _agenerate(self, *args, **kwargs):
+            async with llm_scheduler.aslot():
+                result = await super()._agenerate(*args, **kwargs)
+            prompt_stats.record(_generation_info(result))
+            return result
+
+        async def _astream(self, *args, **kwargs):
+            async with llm_scheduler.aslot():
+                async for chunk in super()._astream(*args, **kwargs):
+                    prompt_stats.record(chunk.generation_info)
+                    yield chunk
+
     # Shared Embeddings Model
     print("Loading embeddings model: bge-m3...")
-    shared_embeddings = OllamaEmbeddings(model="bge-m3")
+    ollama_embeddings = OllamaEmbeddings(model="bge-m3")
+    # Query embeddings are cached and concurrent calls coalesced (see embedding_service.py)
+    shared_embeddings = CachingEmbeddings(ollama_embeddings) if EMBED_CACHE else ollama_embeddings
 
-    # Shared Chat Model  
+    # Shared Chat Model
     print("Loading chat model: qwen3:14b...")
-    shared_chat_model = ChatOllama(
+    # Concurrency limit and priority queue in front of Ollama (see llm_scheduler.py)
+    shared_chat_model = ScheduledChatOllama(
         model="qwen3:14b",
         temperature=0.2,
         top_k=40,
         top_p=0.9,
         repeat_penalty=1.2,
+        keep_alive=int(CHAT_KEEP_ALIVE) if CHAT_KEEP_ALIVE.lstrip("-").isdigit() else CHAT_KEEP_ALIVE,
+        num_ctx=CHAT_NUM_CTX,
     )
 
-    # Shared Reranker Model
-    print("Loading reranker model: BAAI/bge-reranker-v2-m3...")
-    shared_reranker = HuggingFaceCrossEncoder(model_name="BAAI/bge-reranker-v2-m3")
-    # shared_reranker = HuggingFaceCrossEncoder(model_name="BAAI/bge-reranker-v2-m3")
-    shared_compressor = CrossEncoderReranker(model=shared_reranker, top_n=5)
+    from rerank_service import BatchingCrossEncoder, RERANK_BATCHING
+    from rerank_service import CachingCrossEncoderReranker, RerankScoreCache, RERANK_CACHE
+    from reranker_backends import load_cross_encoder, RERANKER_BACKEND, RERANKER_MODEL
+    from model_server import ModelClient, RemoteCrossEncoder, MODEL_SERVER_SOCKET
+
+    # ASR and reranker hosted by model_server.py, shared by every web worker
+    model_client = ModelClient() if MODEL_SERVER_SOCKET else None
+
+    # Shared Reranker Model (torch / onnx / onnx-int8, see reranker_backends.py)
+    def load_reranker():
+        if model_client is not None:
+            print(f"Using reranker from model server: {MODEL_SERVER_SOCKET}")
+            return RemoteCrossEncoder(model_client)
+        print(f"Loading reranker model: {RERANKER_MODEL} ({RERANKER_BACKEND})...")
+        reranker = load_cross_encoder()
+        if RERANK_BATCHING:
+            # Concurrent requests share one padded forward pass
+            return BatchingCrossEncoder(reranker)
+        return reranker
+
+    model_manager.register("reranker", load_reranker)
 
-    print("✅ All shared models loaded successfully!")
+    # Cross-encoder scores shared by every domain, keyed by (query hash, doc id)
+    rerank_score_cache = RerankScoreCache() if RERANK_CACHE else None
+
+    print("✅ Shared model clients created, reranker is managed by model_manager")
 
 except ImportError as e:
     print(f"❌ Error importing dependencies: {e}")
@@ -44,5 +117,60 @@ except ImportError as e:
     # Create dummy objects to prevent import errors
     shared_embeddings = None
     shared_chat_model = None
-    shared_compressor = None
-    shared_reranker = None
\ No newline at end of file
+    rerank_score_cache = None
+    model_client = None
+
+
+def get_reranker():
+    """The shared cross-encoder, loaded on first use"""
+    if "reranker" not in model_manager:
+        return None
+    return model_manager.get("reranker")
+
+
+def embedding_stats():
+    """Cache and batching metrics of shared_embeddings"""
+    return shared_embeddings.stats() if hasattr(shared_embeddings, "stats") else None
+
+
+def reranker_stats():
+    """Batching metrics of the reranker, None until it is loaded"""
+    if not model_manager.is_loaded("reranker"):
+        return None
+    reranker = model_manager.get("reranker")
+    return reranker.stats() if hasattr(reranker, "stats") else None
+
+
+def warm_up_chat_model(system_prompts=()):
+    """Load qwen3 into Ollama and prefill each system prompt with a one-token request,
+    so the first chat request neither loads the model nor prefills the guidelines"""
+    if shared_chat_model is None or not CHAT_WARMUP:
+        return
+    from langchain_core.messages import HumanMessage, SystemMessage
+    from llm_scheduler import llm_priority, BATCH
+
+    model = shared_chat_model.model_copy(update={"num_predict": 1})
+    for system_prompt in [prompt for prompt in system_prompts if prompt] or [None]:
+        messages = ([SystemMessage(system_prompt)] if system_prompt else []) + [HumanMessage("你好")]
+        start_time = time.time()
+        try:
+            with llm_priority(BATCH):
+                model.invoke(messages)
+        except Exception as e:
+            print(f"⚠️  Chat model warm-up failed: {e}")
+            return
+        print(f"🔥 Chat model warm-up: {time.time() - start_time:.2f}s")
+
+
+def get_compressor(top_n=5):
+    """A CrossEncoderReranker over the shared cross-encoder and score cache"""
+    return CachingCrossEncoderReranker(model=get_reranker(), top_n=top_n, score_cache=rerank_score_cache)
+
+
+def __getattr__(name):
+    # Keep `from shared_models import shared_reranker/shared_compressor` working
+    if name == "shared_reranker":
+        return get_reranker()
+    if name == "shared_compressor":
+        return get_compressor()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,256 @@
+"""
+Single-flight coalescing of identical in-flight questions.
+
+Requests with the same key, (model_type, normalized question, domain version),
+that arrive while an answer is being generated attach to that generation
+instead of starting their own retrieval, rerank and LLM call. A flight is a
+growing list of answer segments: streaming readers replay what was already
+produced and then follow the live token stream, blocking readers wait for the
+whole answer. The flight is dropped when it finishes, later requests are
+served by the answer store / semantic cache.
+
+Streaming flights are produced in the background (a thread, or a task on the
+event loop for async sources), so the generation is not tied to the first
+client; it is stopped when every reader has gone away.
+"""
+
+import asyncio
+import contextvars
+import threading
+
+from answer_store import normalize_question
+
+# Producer tasks of async flights; the event loop only keeps weak references
+_tasks = set()
+
+
+class FlightCancelled(RuntimeError):
+    """The leader of a flight was cancelled before it produced the answer"""
+
+
+def flight_key(model_type, question, version):
+    return model_type, normalize_question(question), version
+
+
+class _Flight:
+    def __init__(self):
+        self.chunks = []
+        self.done = False
+        self.error = None
+        self.readers = 0
+        self.cond = threading.Condition()
+        self._async_waiters = []
+
+    def _wake(self):
+        self.cond.notify_all()
+        for loop, future in self._async_waiters:
+            loop.call_soon_threadsafe(_resolve, future)
+        self._async_waiters = []
+
+    def publish(self, chunk):
+        with self.cond:
+            self.chunks.append(chunk)
+            self._wake()
+
+    def finish(self, error=None):
+        with self.cond:
+            self.done = True
+            self.error = error
+            self._wake()
+
+    def _take(self, index):
+        """(new chunks from index, finished) under the lock"""
+        return self.chunks[index:], self.done
+
+    def read(self):
+        """Iterate every chunk from the start, blocking for new ones"""
+        index = 0
+        while True:
+            with self.cond:
+                while len(self.chunks) <= index and not self.done:
+                    self.cond.wait()
+                chunks, done = self._take(index)
+            index += len(chunks)
+            yield from chunks
+            if done and index >= len(self.chunks):
+                if self.error is not None:
+                    raise self.error
+                return
+
+    async def aread(self):
+        index = 0
+        loop = asyncio.get_running_loop()
+        while True:
+            with self.cond:
+                chunks, done = self._take(index)
+                future = None
+                if not chunks and not done:
+                    future = loop.create_future()
+                    self._async_waiters.append((loop, future))
+            if future is not None:
+                await future
+                continue
+            index += len(chunks)
+            for chunk in chunks:
+                yield chunk
+            if done and index >= len(self.chunks):
+                if self.error is not None:
+                    raise self.error
+                return
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class SingleFlight:
+    """Registry of in-flight answers, shared by blocking and streaming callers"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}
+        self._started = 0
+        self._coalesced = 0
+
+    def _join(self, key):
+        """(flight, leader) for key, creating the flight when there is none"""
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                self._coalesced += 1
+                print(f"🔗 Joined in-flight answer: {key[1][:30]}")
+                leader = False
+            else:
+                flight = self._flights[key] = _Flight()
+                self._started += 1
+                leader = True
+            with flight.cond:
+                flight.readers += 1
+            return flight, leader
+
+    def _leave(self, flight):
+        with flight.cond:
+            flight.readers -= 1
+
+    def _finish(self, key, flight, error=None):
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+        flight.finish(error)
+
+    def _abandon(self, key, flight):
+        """Drop the flight when nobody reads it any more; new readers then start a new one"""
+        with self._lock:
+            with flight.cond:
+                if flight.readers > 0:
+                    return False
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+        print(f"⚠️  Every reader left, stopping generation: {key[1][:30]}")
+        flight.finish()
+        return True
+
+    def in_flight(self, key):
+        with self._lock:
+            return key in self._flights
+
+    def run(self, key, fn):
+        """Return fn() (a string), or the answer of the identical call already in flight"""
+        flight, leader = self._join(key)
+        try:
+            if leader:
+                try:
+                    answer = fn()
+                except Exception as e:
+                    self._finish(key, flight, e)
+                    raise
+                flight.publish(answer)
+                self._finish(key, flight)
+                return answer
+            return "".join(flight.read())
+        finally:
+            self._leave(flight)
+
+    async def arun(self, key, fn):
+        """Async run(): fn is a coroutine function"""
+        while True:
+            try:
+                return await self._arun(key, fn)
+            except FlightCancelled:
+                # The leader's client went away; generate it ourselves
+                continue
+
+    async def _arun(self, key, fn):
+        flight, leader = self._join(key)
+        try:
+            if leader:
+                try:
+                    answer = await fn()
+                except BaseException as e:
+                    # Also on cancellation (client gone), or followers would wait forever
+                    self._finish(key, flight, e if isinstance(e, Exception) else FlightCancelled("Generation cancelled"))
+                    raise
+                flight.publish(answer)
+                self._finish(key, flight)
+                return answer
+            return "".join([chunk async for chunk in flight.aread()])
+        finally:
+            self._leave(flight)
+
+    def _produce(self, key, flight, source):
+        try:
+            for chunk in source:
+                flight.publish(chunk)
+                if self._abandon(key, flight):
+                    source.close()
+                    return
+        except Exception as e:
+            self._finish(key, flight, e)
+            return
+        self._finish(key, flight)
+
+    async def _aproduce(self, key, flight, source):
+        try:
+            async for chunk in source:
+                flight.publish(chunk)
+                if self._abandon(key, flight):
+                    await source.aclose()
+                    return
+        except BaseException as e:
+            self._finish(key, flight, e if isinstance(e, Exception) else FlightCancelled("Generation cancelled"))
+            if not isinstance(e, Exception):
+                raise
+            return
+        self._finish(key, flight)
+
+    def stream(self, key, factory):
+        """Segments of factory() (a generator), shared with identical in-flight streams"""
+        flight, leader = self._join(key)
+        if leader:
+            # Generation runs in its own thread and outlives the first client
+            context = contextvars.copy_context()
+            thread = threading.Thread(target=context.run, args=(self._produce, key, flight, factory()),
+                                      name="singleflight", daemon=True)
+            thread.start()
+        try:
+            yield from flight.read()
+        finally:
+            self._leave(flight)
+
+    async def astream(self, key, factory):
+        """Async stream(): factory() returns an async generator"""
+        flight, leader = self._join(key)
+        if leader:
+            task = asyncio.get_running_loop().create_task(self._aproduce(key, flight, factory()))
+            _tasks.add(task)
+            task.add_done_callback(_tasks.discard)
+        try:
+            async for chunk in flight.aread():
+                yield chunk
+        finally:
+            self._leave(flight)
+
+    def stats(self):
+        with self._lock:
+            return {"in_flight": len(self._flights), "started": self._started, "coalesced": self._coalesced}
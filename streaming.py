@@ -0,0 +1,223 @@
+"""
+Helpers for streaming LLM answers to the browser.
+
+qwen3 emits a <think>...</think> block before the real answer. When the answer
+arrives token by token the tags can be split across chunks, so filtering is
+done with a small state machine instead of a regex over the full text.
+"""
+
+import json
+import re
+
+THINK_OPEN = "<think>"
+THINK_CLOSE = "</think>"
+
+# Flush the OpenCC buffer at these characters so that multi-character phrases
+# (e.g. 软件 -> 軟體) are never split across two convert() calls.
+SEGMENT_BREAKS = set("。！？；，、：\n!?;,.:")
+MAX_PENDING_CHARS = 32
+
+
+def strip_think(text):
+    """Remove complete <think>...</think> blocks from a finished answer."""
+    return re.sub(r'<think>[\s\S]*?</think>', '', text)
+
+
+def _partial_tag_suffix(text, tag):
+    """Return the length of the longest suffix of text that is a prefix of tag."""
+    for size in range(min(len(text), len(tag) - 1), 0, -1):
+        if tag.startswith(text[-size:]):
+            return size
+    return 0
+
+
+class ThinkTagFilter:
+    """Stateful <think> stripper that works across chunk boundaries."""
+
+    def __init__(self):
+        self._buffer = ""
+        self._in_think = False
+
+    def feed(self, chunk):
+        """Consume a chunk and return the visible text that is safe to emit."""
+        self._buffer += chunk
+        output = []
+        while self._buffer:
+            tag = THINK_CLOSE if self._in_think else THINK_OPEN
+            index = self._buffer.find(tag)
+            if index >= 0:
+                if not self._in_think:
+                    output.append(self._buffer[:index])
+                self._buffer = self._buffer[index + len(tag):]
+                self._in_think = not self._in_think
+                continue
+            # Keep a possible partial tag at the end for the next chunk
+            keep = _partial_tag_suffix(self._buffer, tag)
+            if not self._in_think:
+                output.append(self._buffer[:len(self._buffer) - keep])
+            self._buffer = self._buffer[len(self._buffer) - keep:]
+            break
+        return "".join(output)
+
+    def flush(self):
+        """Return whatever is left once the stream ends."""
+        remaining = "" if self._in_think else self._buffer
+        self._buffer = ""
+        return remaining
+
+
+class IncrementalConverter:
+    """Convert streamed text with OpenCC one segment at a time."""
+
+    def __init__(self, converter):
+        self._converter = converter
+        self._pending = ""
+
+    def feed(self, text):
+        self._pending += text
+        cut = -1
+        for index in range(len(self._pending) - 1, -1, -1):
+            if self._pending[index] in SEGMENT_BREAKS:
+                cut = index + 1
+                break
+        if cut < 0 and len(self._pending) >= MAX_PENDING_CHARS:
+            cut = len(self._pending)
+        if cut <= 0:
+            return ""
+        segment, self._pending = self._pending[:cut], self._pending[cut:]
+        return self._converter.convert(segment)
+
+    def flush(self):
+        segment, self._pending = self._pending, ""
+        return self._converter.convert(segment) if segment else ""
+
+
+# Sentence boundaries used to pipeline TTS while the answer is still streaming
+SENTENCE_ENDINGS = set("。！？!?")
+MIN_SENTENCE_CHARS = 6
+
+
+class SentenceSplitter:
+    """Accumulate streamed text and cut it into complete sentences."""
+
+    def __init__(self, min_chars=MIN_SENTENCE_CHARS):
+        self._pending = ""
+        self._min_chars = min_chars
+
+    def feed(self, text):
+        """Return the list of sentences completed by this piece of text."""
+        sentences = []
+        start = 0
+        self._pending += text
+        for index, char in enumerate(self._pending):
+            if char in SENTENCE_ENDINGS and index + 1 - start >= self._min_chars:
+                sentence = self._pending[start:index + 1].strip()
+                if sentence:
+                    sentences.append(sentence)
+                start = index + 1
+        self._pending = self._pending[start:]
+        return sentences
+
+    def flush(self):
+        sentence, self._pending = self._pending.strip(), ""
+        return [sentence] if sentence else []
+
+
+class SentenceAudioPipeline:
+    """Synthesize each finished sentence on an executor and release the audio in order"""
+
+    def __init__(self, executor, synthesize, voice):
+        self._executor = executor
+        self._synthesize = synthesize
+        self._voice = voice
+        self._splitter = SentenceSplitter()
+        self.pending = []  # (index, future), oldest first
+        self.count = 0
+
+    def _submit(self, sentences):
+        for sentence in sentences:
+            future = self._executor.submit(self._synthesize, sentence, self._voice)
+            self.pending.append((self.count, future))
+            self.count += 1
+
+    def feed(self, text):
+        self._submit(self._splitter.feed(text))
+
+    def flush(self):
+        self._submit(self._splitter.flush())
+
+    def ready(self, wait=False):
+        """(index, result) of finished sentences, never skipping ahead of an unfinished one.
+
+        A sentence whose synthesis failed is left out: the text answer must not
+        be lost because edge_tts failed on one sentence.
+        """
+        results = []
+        while self.pending and (wait or self.pending[0][1].done()):
+            index, future = self.pending.pop(0)
+            try:
+                results.append((index, future.result()))
+            except Exception as e:
+                print(f"⚠️  Audio for sentence {index} failed, skipped: {e}")
+        return results
+
+    def cancel(self):
+        for _, future in self.pending:
+            future.cancel()
+        self.pending = []
+
+
+class AnswerStream:
+    """<think> filtering plus incremental OpenCC for one streamed answer"""
+
+    def __init__(self, converter):
+        self._think_filter = ThinkTagFilter()
+        self._converter = IncrementalConverter(converter)
+        self._started = False
+
+    def feed(self, chunk):
+        visible = self._think_filter.feed(chunk)
+        if not self._started:
+            # The answer usually starts with blank lines after </think>
+            visible = visible.lstrip()
+            self._started = bool(visible)
+        return self._converter.feed(visible)
+
+    def finish(self):
+        tail = self._think_filter.flush()
+        if not self._started:
+            tail = tail.lstrip()
+        return self._converter.feed(tail) + self._converter.flush()
+
+
+def stream_answer(chunks, converter):
+    """Yield cleaned, converted text segments from raw LLM chunks."""
+    answer = AnswerStream(converter)
+    for chunk in chunks:
+        segment = answer.feed(chunk)
+        if segment:
+            yield segment
+    segment = answer.finish()
+    if segment:
+        yield segment
+
+
+async def astream_answer(chunks, converter):
+    """Async version of stream_answer for qa_chain.astream()."""
+    answer = AnswerStream(converter)
+    async for chunk in chunks:
+        segment = answer.feed(chunk)
+        if segment:
+            yield segment
+    segment = answer.finish()
+    if segment:
+        yield segment
+
+
+def sse_event(data, event=None):
+    """Format one Server-Sent Event with a JSON payload."""
+    lines = []
+    if event:
+        lines.append(f"event: {event}")
+    lines.append("data: " + json.dumps(data, ensure_ascii=False))
+    return "\n".join(lines) + "\n\n"
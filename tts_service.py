@@ -0,0 +1,165 @@
+"""
+Text-to-speech helpers built on edge_tts.
+
+Synthesized audio is stored in a content-addressed cache keyed on
+(voice, text hash) and served by URL, so repeated answers (question-bank
+answers in particular) cost no synthesis and JSON payloads stay small.
+"""
+
+import asyncio
+import hashlib
+import os
+import threading
+import time
+import uuid
+
+import edge_tts
+
+TTS_CACHE_DIR = os.environ.get("TTS_CACHE_DIR", "tts_cache")
+TTS_CACHE_MAX_BYTES = int(os.environ.get("TTS_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+# Files returned by get_or_synthesize or served by /audio within this many
+# seconds are never evicted. The URL is handed out before the client fetches it,
+# and the chat page fetches sentence audio only when the sentence starts playing,
+# so this has to cover the playback of a long answer
+TTS_CACHE_EVICT_GRACE = float(os.environ.get("TTS_CACHE_EVICT_GRACE", "300"))
+
+
+def select_voice(gender="female"):
+    """Select voice by gender (male -> Yunyang, female -> Xiaoxiao)"""
+    if str(gender).lower() == 'male':
+        return "zh-CN-YunyangNeural"
+    return "zh-CN-XiaoxiaoNeural"
+
+
+async def synthesize_speech(text, voice):
+    """Synthesize text to MP3 bytes in memory, without writing to temp/."""
+    communicate = edge_tts.Communicate(text=text, voice=voice)
+    audio = bytearray()
+    async for chunk in communicate.stream():
+        if chunk["type"] == "audio":
+            audio.extend(chunk["data"])
+    return bytes(audio)
+
+
+def synthesize_speech_sync(text, voice):
+    """Blocking wrapper so synthesis can run in a worker thread."""
+    return asyncio.run(synthesize_speech(text, voice))
+
+
+def audio_key(text, voice):
+    return hashlib.sha256(f"{voice}\n{text}".encode("utf-8")).hexdigest()
+
+
+class TTSCache:
+    """MP3 files named <sha256(voice, text)>.mp3 with size-based LRU eviction"""
+
+    def __init__(self, directory=TTS_CACHE_DIR, max_bytes=TTS_CACHE_MAX_BYTES, grace=TTS_CACHE_EVICT_GRACE):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.grace = grace
+        self._lock = threading.Lock()
+        # key -> [lock, users]: one synthesis per key at a time
+        self._key_locks = {}
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+        self._bytes = sum(entry.stat().st_size for entry in os.scandir(directory) if entry.name.endswith(".mp3"))
+
+    def path(self, key):
+        return os.path.join(self.directory, f"{key}.mp3")
+
+    def touch(self, key):
+        """Mark the file as recently used so eviction skips it"""
+        try:
+            os.utime(self.path(key))
+        except OSError:
+            pass
+
+    def _hit(self, key):
+        if not os.path.exists(self.path(key)):
+            return False
+        self.touch(key)
+        with self._lock:
+            self.hits += 1
+        return True
+
+    def _key_lock(self, key):
+        with self._lock:
+            entry = self._key_locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+            return entry[0]
+
+    def _release_key_lock(self, key):
+        with self._lock:
+            entry = self._key_locks[key]
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._key_locks[key]
+
+    def get_or_synthesize(self, text, voice):
+        """Return the cache key of the audio for (text, voice), synthesizing on a miss"""
+        key = audio_key(text, voice)
+        path = self.path(key)
+        if self._hit(key):
+            return key
+
+        # Concurrent misses on the same key wait for the first synthesis
+        lock = self._key_lock(key)
+        try:
+            with lock:
+                if self._hit(key):
+                    return key
+                audio = synthesize_speech_sync(text, voice)
+                tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+                with open(tmp_path, "wb") as f:
+                    f.write(audio)
+                # link fails if another worker process created the file meanwhile,
+                # then its file is kept and its bytes are already counted
+                try:
+                    os.link(tmp_path, path)
+                    created = True
+                except FileExistsError:
+                    created = False
+                finally:
+                    os.remove(tmp_path)
+        finally:
+            self._release_key_lock(key)
+
+        with self._lock:
+            self.misses += 1
+            if created:
+                self._bytes += len(audio)
+            if self._bytes > self.max_bytes:
+                self._evict()
+        return key
+
+    def _evict(self):
+        """Delete least recently used files until the cache is 90% of max_bytes"""
+        entries = [entry for entry in os.scandir(self.directory) if entry.name.endswith(".mp3")]
+        entries.sort(key=lambda entry: entry.stat().st_mtime)
+        total = sum(entry.stat().st_size for entry in entries)
+        recent = time.time() - self.grace
+        for entry in entries:
+            if total <= self.max_bytes * 0.9:
+                break
+            try:
+                if entry.stat().st_mtime >= recent:
+                    # Sorted by mtime: every remaining file is recent too
+                    break
+                size = entry.stat().st_size
+                os.remove(entry.path)
+                total -= size
+            except OSError:
+                pass
+        self._bytes = total
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / total if total else 0.0,
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+            }